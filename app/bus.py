@@ -0,0 +1,136 @@
+"""
+Bus de avisos entre procesos (workers) de la API.
+
+Con varios workers cada uno tiene su propia caché y sus propias conexiones
+SSE abiertas. Cuando un worker cambia algo publica un aviso corto
+(ej: "cache:catalogos" o "eventos") y todos los workers lo reciben.
+
+- BusPostgres: usa LISTEN/NOTIFY de Postgres, no necesita nada más.
+- BusLocal:    todo en memoria del mismo proceso, para pruebas y desarrollo.
+
+Si el aviso se publica con la sesión de la petición (publicar(mensaje, db))
+solo sale cuando esa sesión hace commit, y no sale si hace rollback.
+"""
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.database import engine, DATABASE_URL
+import logging
+import os
+import select
+import threading
+
+CANAL = "solicitudes_avisos"
+
+logger = logging.getLogger(__name__)
+
+
+# ── Avisos pendientes de una sesión (solo BusLocal) ──────────
+# Se guardan en db.info y se entregan cuando la sesión hace commit
+@event.listens_for(Session, "after_commit")
+def _entregar_pendientes(db):
+    for bus_destino, mensaje in db.info.pop("avisos_pendientes", []):
+        bus_destino.entregar(mensaje)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_pendientes(db, transaccion_anterior):
+    if transaccion_anterior.parent is None:  # no al deshacer un savepoint
+        db.info.pop("avisos_pendientes", None)
+
+
+class BusLocal:
+    def __init__(self):
+        self._suscriptores = []
+
+    def suscribir(self, callback):
+        self._suscriptores.append(callback)
+
+    def publicar(self, mensaje: str, db: Session = None):
+        """Sin `db` se entrega ya; con `db`, cuando esa sesión haga commit"""
+        if db is None:
+            self.entregar(mensaje)
+        else:
+            db.info.setdefault("avisos_pendientes", []).append((self, mensaje))
+
+    def entregar(self, mensaje: str):
+        """Llama a los suscriptores de este proceso"""
+        for callback in list(self._suscriptores):
+            callback(mensaje)
+
+    def iniciar(self):
+        pass
+
+    def detener(self):
+        pass
+
+
+class BusPostgres(BusLocal):
+    def __init__(self, engine, canal: str = CANAL):
+        super().__init__()
+        self.engine  = engine
+        self.canal   = canal
+        self._parar  = threading.Event()
+        self._hilo   = None
+
+    def publicar(self, mensaje: str, db: Session = None):
+        # Llega también a este mismo proceso a través de su LISTEN.
+        # Postgres solo entrega el NOTIFY cuando la transacción hace commit,
+        # así que con `db` va junto con los datos y sin abrir otra conexión
+        consulta = text("SELECT pg_notify(:canal, :mensaje)")
+        parametros = {"canal": self.canal, "mensaje": mensaje}
+        if db is not None:
+            db.execute(consulta, parametros)
+            return
+        with self.engine.begin() as conn:
+            conn.execute(consulta, parametros)
+
+    def iniciar(self):
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._escuchar, name="bus-postgres", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+        if self._hilo:
+            self._hilo.join(timeout=5)
+
+    def _escuchar(self):
+        # Si se cae la conexión volvemos a escuchar; mientras tanto las
+        # cachés pueden quedar desactualizadas, así que las vaciamos al volver
+        while not self._parar.is_set():
+            conexion = None
+            try:
+                conexion = self.engine.raw_connection()
+                conexion.driver_connection.autocommit = True
+                cursor = conexion.driver_connection.cursor()
+                cursor.execute(f'LISTEN "{self.canal}"')
+                self.entregar("cache:")
+
+                pg = conexion.driver_connection
+                while not self._parar.is_set():
+                    if select.select([pg], [], [], 5) == ([], [], []):
+                        continue
+                    pg.poll()
+                    while pg.notifies:
+                        aviso = pg.notifies.pop(0)
+                        self.entregar(aviso.payload)
+            except Exception:
+                logger.exception("Bus de avisos desconectado, reintentando")
+                self._parar.wait(2)
+            finally:
+                if conexion is not None:
+                    conexion.invalidate()
+
+
+def crear_bus():
+    """Elige el bus según BUS_AVISOS (postgres o local)"""
+    tipo = os.getenv("BUS_AVISOS")
+    if not tipo:
+        tipo = "postgres" if DATABASE_URL and DATABASE_URL.startswith("postgres") else "local"
+    if tipo == "postgres":
+        return BusPostgres(engine)
+    return BusLocal()
+
+
+# Instancia única para todo el proceso
+bus = crear_bus()
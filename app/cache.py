@@ -0,0 +1,40 @@
+"""
+Caché en memoria del proceso para datos que casi nunca cambian (catálogos).
+
+Cada worker tiene la suya; cuando algo cambia se avisa a todos por el bus
+de invalidación (ver app/bus.py) y cada uno borra sus copias.
+"""
+import threading
+
+
+class CacheLocal:
+    def __init__(self):
+        self._datos   = {}
+        self._version = 0
+        self._lock    = threading.Lock()
+
+    def obtener(self, clave: str, cargar):
+        """Devuelve el valor guardado o lo carga con `cargar()` la primera vez"""
+        with self._lock:
+            if clave in self._datos:
+                return self._datos[clave]
+            version = self._version
+
+        valor = cargar()
+
+        with self._lock:
+            # Si alguien invalidó mientras cargábamos, no guardamos un valor viejo
+            if version == self._version:
+                self._datos[clave] = valor
+        return valor
+
+    def invalidar(self, prefijo: str = ""):
+        """Borra las claves que empiezan con `prefijo` (todas si está vacío)"""
+        with self._lock:
+            self._version += 1
+            for clave in [c for c in self._datos if c.startswith(prefijo)]:
+                del self._datos[clave]
+
+
+# Instancia única para todo el proceso
+cache = CacheLocal()
@@ -1,11 +1,26 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import tuple_, text
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.sql import func
 from app import models, schemas
-import bcrypt
+from app.bus import bus
+from app.cache import cache
+from datetime import datetime, timedelta
+import base64
 import uuid
+import os
+
+# Minutos sin mensajes después de los cuales una sesión de WhatsApp se da por abandonada
+MINUTOS_INACTIVIDAD = int(os.getenv("SESION_MINUTOS_INACTIVIDAD", "30"))
+
+# Segundos que se espera antes de avisar un cambio de estado, por si llegan más
+VENTANA_NOTIFICACION = float(os.getenv("NOTIF_VENTANA_SEGUNDOS", "10"))
 
 
 # Función para encriptar contraseña
+# bcrypt se importa al primer uso: solo lo necesitan el registro y el login
 def hash_password(password: str) -> str:
+    import bcrypt
     salt = bcrypt.gensalt()
     hashed = bcrypt.hashpw(password.encode("utf-8"), salt)
     return hashed.decode("utf-8")
@@ -13,6 +28,7 @@ def hash_password(password: str) -> str:
 
 # Función para verificar contraseña
 def verificar_password(password_plano: str, password_encriptado: str) -> bool:
+    import bcrypt
     return bcrypt.checkpw(
         password_plano.encode("utf-8"),
         password_encriptado.encode("utf-8")
@@ -69,6 +85,38 @@ def crear_usuario(db: Session, usuario: schemas.UsuarioCreate):
 #     return pwd_context.verify(password_plano, password_encriptado)
 
 
+# ══════════════════════════════════════════════════════════════
+# FUNCIONES DE CATÁLOGOS — se guardan en la caché del proceso
+# ══════════════════════════════════════════════════════════════
+# Si se editan los catálogos directamente en la BD hay que avisar a los
+# workers con: python -m app.tareas invalidar catalogos
+
+def get_tipos_solicitud(db: Session):
+    """Devuelve los tipos de solicitud"""
+    return cache.obtener("catalogos:tipos_solicitud", lambda: [
+        schemas.TipoSolicitudOut.model_validate(t)
+        for t in db.query(models.TipoSolicitud).all()
+    ])
+
+
+def get_estados(db: Session):
+    """Devuelve los estados posibles de una solicitud"""
+    return cache.obtener("catalogos:estados", lambda: [
+        schemas.EstadoOut.model_validate(e)
+        for e in db.query(models.Estado).all()
+    ])
+
+
+def get_estado_por_codigo(db: Session, codigo: str):
+    """Busca un estado por su código — ej: PENDIENTE"""
+    return next((e for e in get_estados(db) if e.codigo == codigo), None)
+
+
+def invalidar_catalogos():
+    """Avisa a todos los workers que vuelvan a leer los catálogos"""
+    bus.publicar("cache:catalogos")
+
+
 # ══════════════════════════════════════════════════════════════
 # FUNCIONES DE SOLICITUD
 # ══════════════════════════════════════════════════════════════
@@ -81,9 +129,7 @@ def crear_solicitud(db: Session, solicitud: schemas.SolicitudCreate, usuario_id:
     codigo = f"SOL-{__import__('datetime').datetime.now().year}-{str(total + 1).zfill(5)}"
 
     # Buscamos el estado inicial — siempre es PENDIENTE
-    estado_pendiente = db.query(models.Estado).filter(
-        models.Estado.codigo == "PENDIENTE"
-    ).first()
+    estado_pendiente = get_estado_por_codigo(db, "PENDIENTE")
 
     db_solicitud = models.Solicitud(
         codigo_referencia = codigo,
@@ -94,6 +140,9 @@ def crear_solicitud(db: Session, solicitud: schemas.SolicitudCreate, usuario_id:
         canal_origen      = "WHATSAPP"
     )
     db.add(db_solicitud)
+    db.flush()  # para tener el id antes del commit
+    registrar_evento_solicitud(db, db_solicitud, "CREADA")
+    bus.publicar("eventos", db)  # sale con el commit
     db.commit()
     db.refresh(db_solicitud)
     return db_solicitud
@@ -151,16 +200,205 @@ def actualizar_estado_solicitud(
 
     # Actualizamos el estado
     solicitud.estado_id = nuevo_estado_id
+    registrar_evento_solicitud(db, solicitud, "CAMBIO_ESTADO")
+    bus.publicar("eventos", db)  # sale con el commit
+
+    # Avisamos al estudiante por WhatsApp para que no tenga que preguntar.
+    # Queda en la bandeja de salida dentro de esta misma transacción
+    telefono = solicitud.solicitante.telefono_whatsapp
+    estado = next((e for e in get_estados(db) if e.id == nuevo_estado_id), None)
+    if telefono and estado:
+        encolar_notificacion(
+            db,
+            solicitud.id,
+            telefono,
+            f"📄 Tu solicitud *{solicitud.codigo_referencia}* cambió a *{estado.nombre}*."
+            + (f"\n\n💬 {comentario}" if comentario else "")
+        )
+
     db.commit()
     db.refresh(solicitud)
     return solicitud
 
 
+def encolar_notificacion(db: Session, solicitud_id: str, telefono: str, texto: str):
+    """
+    Deja un aviso en la bandeja de salida (sin hacer commit).
+    Si la solicitud ya tiene uno pendiente se reemplaza el texto y se conserva
+    su hora de envío: los cambios seguidos se juntan en un solo mensaje.
+    """
+    tabla = models.NotificacionSaliente
+    consulta = pg_insert(tabla).values(
+        solicitud_id      = solicitud_id,
+        telefono          = telefono,
+        texto             = texto,
+        estado            = "PENDIENTE",
+        version           = 1,
+        intentos          = 0,
+        enviar_despues_de = func.now() + timedelta(seconds=VENTANA_NOTIFICACION)
+    )
+    db.execute(consulta.on_conflict_do_update(
+        index_elements = [tabla.solicitud_id],
+        index_where    = text("estado = 'PENDIENTE'"),  # literal: así Postgres reconoce el índice parcial
+        set_           = {
+            "telefono": consulta.excluded.telefono,
+            "texto":    consulta.excluded.texto,
+            "version":  tabla.version + 1,
+        }
+    ))
+
+
 def get_historial_solicitud(db: Session, solicitud_id: str):
     """Devuelve el historial completo de estados de una solicitud"""
-    return db.query(models.HistorialEstado).filter(
+    return db.query(models.HistorialEstado).options(
+        joinedload(models.HistorialEstado.estado_nuevo)
+    ).filter(
         models.HistorialEstado.solicitud_id == solicitud_id
-    ).all()
+    ).order_by(models.HistorialEstado.creado_en, models.HistorialEstado.id).all()
+
+
+# ── Línea de tiempo: historial de estados + mensajes de WhatsApp ──
+# Se pagina con un cursor (fecha, fuente, id) del último evento entregado.
+# Cada fuente (historial, mensajes y mensajes archivados) se lee con una sola
+# consulta que usa su índice (solicitud_id, creado_en), así la primera página cuesta lo mismo
+# sin importar cuántos eventos tenga la solicitud.
+
+FUENTES_TIMELINE = {"HISTORIAL": 0, "WHATSAPP": 1}  # orden de desempate en la misma fecha
+
+
+def codificar_cursor(fecha: datetime, fuente: str, id: int) -> str:
+    texto = f"{fecha.isoformat()}|{fuente}|{id}"
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii")
+
+
+def decodificar_cursor(cursor: str):
+    """Devuelve (fecha, fuente, id); lanza ValueError si el cursor no es válido"""
+    try:
+        fecha, fuente, id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        if fuente not in FUENTES_TIMELINE:
+            raise ValueError(fuente)
+        return datetime.fromisoformat(fecha), fuente, int(id)
+    except Exception as error:
+        raise ValueError("Cursor inválido") from error
+
+
+def _despues_del_cursor(modelo, fuente: str, cursor):
+    """Condición 'viene después del cursor' que aprovecha el índice (solicitud_id, creado_en)"""
+    fecha, fuente_cursor, id = cursor
+    orden, orden_cursor = FUENTES_TIMELINE[fuente], FUENTES_TIMELINE[fuente_cursor]
+    if orden > orden_cursor:
+        return modelo.creado_en >= fecha
+    if orden < orden_cursor:
+        return modelo.creado_en > fecha
+    return tuple_(modelo.creado_en, modelo.id) > tuple_(fecha, id)
+
+
+def get_timeline_solicitud(db: Session, solicitud_id: str, cursor: str = None, limite: int = 50):
+    """
+    Devuelve (eventos, siguiente_cursor). Cada evento es un dict con la
+    fuente (HISTORIAL o WHATSAPP) y los datos de esa fila.
+    """
+    posicion = decodificar_cursor(cursor) if cursor else None
+
+    historial = db.query(models.HistorialEstado).options(
+        joinedload(models.HistorialEstado.estado_nuevo)
+    ).filter(models.HistorialEstado.solicitud_id == solicitud_id)
+
+    mensajes = db.query(models.MensajeWhatsApp).filter(
+        models.MensajeWhatsApp.solicitud_id == solicitud_id
+    )
+
+    # Los mensajes viejos los movió el trabajo de retención al archivo.
+    # Conservan su id original, así que son la misma fuente WHATSAPP
+    archivados = db.query(models.MensajeWhatsAppArchivo).filter(
+        models.MensajeWhatsAppArchivo.solicitud_id == solicitud_id
+    )
+
+    if posicion:
+        historial  = historial.filter(_despues_del_cursor(models.HistorialEstado, "HISTORIAL", posicion))
+        mensajes   = mensajes.filter(_despues_del_cursor(models.MensajeWhatsApp, "WHATSAPP", posicion))
+        archivados = archivados.filter(_despues_del_cursor(models.MensajeWhatsAppArchivo, "WHATSAPP", posicion))
+
+    # Pedimos uno de más a cada fuente para saber si queda otra página
+    historial = historial.order_by(
+        models.HistorialEstado.creado_en, models.HistorialEstado.id
+    ).limit(limite + 1).all()
+    mensajes = mensajes.order_by(
+        models.MensajeWhatsApp.creado_en, models.MensajeWhatsApp.id
+    ).limit(limite + 1).all()
+    archivados = archivados.order_by(
+        models.MensajeWhatsAppArchivo.creado_en, models.MensajeWhatsAppArchivo.id
+    ).limit(limite + 1).all()
+
+    eventos = [
+        {"fuente": "HISTORIAL", "id": h.id, "creado_en": h.creado_en,
+         "estado_nuevo": schemas.EstadoOut.model_validate(h.estado_nuevo), "comentario": h.comentario}
+        for h in historial
+    ] + [
+        {"fuente": "WHATSAPP", "id": m.id, "creado_en": m.creado_en,
+         "direccion": m.direccion, "contenido": m.contenido}
+        for m in archivados + mensajes
+    ]
+    eventos.sort(key=lambda e: (e["creado_en"], FUENTES_TIMELINE[e["fuente"]], e["id"]))
+
+    siguiente_cursor = None
+    if len(eventos) > limite:
+        eventos = eventos[:limite]
+        ultimo  = eventos[-1]
+        siguiente_cursor = codificar_cursor(ultimo["creado_en"], ultimo["fuente"], ultimo["id"])
+    return eventos, siguiente_cursor
+
+
+# ══════════════════════════════════════════════════════════════
+# FUNCIONES DE EVENTOS — feed para los paneles del personal
+# ══════════════════════════════════════════════════════════════
+
+# Los clientes retoman el feed "desde el id X", así que los ids deben hacerse
+# visibles en orden. Un SERIAL se asigna al insertar, no al hacer commit: si el
+# evento 11 se confirmara antes que el 10, quien leyó el 11 nunca vería el 10.
+# Este candado de transacción pone en fila a quienes registran eventos hasta su
+# commit, y como el evento se inserta al hacer flush (después del candado),
+# el orden de los ids es el mismo que el de los commits.
+CANDADO_EVENTOS = 7301
+
+
+def registrar_evento_solicitud(db: Session, solicitud: models.Solicitud, tipo_evento: str):
+    """Agrega un evento a la transacción actual — se publica cuando se hace commit"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:candado)"), {"candado": CANDADO_EVENTOS})
+
+    evento = models.EventoSolicitud(
+        solicitud_id      = solicitud.id,
+        tipo_evento       = tipo_evento,
+        estado_id         = solicitud.estado_id,
+        tipo_solicitud_id = solicitud.tipo_solicitud_id
+    )
+    db.add(evento)
+    return evento
+
+
+def get_ultimo_evento_id(db: Session) -> int:
+    """Devuelve el id del evento más reciente, o 0 si no hay ninguno"""
+    return db.query(func.max(models.EventoSolicitud.id)).scalar() or 0
+
+
+def get_eventos_desde(
+    db: Session,
+    desde: int,
+    estado_id: int = None,
+    tipo_solicitud_id: int = None,
+    limite: int = 100
+):
+    """Devuelve los eventos con id mayor que `desde`, en orden"""
+    query = db.query(models.EventoSolicitud).filter(models.EventoSolicitud.id > desde)
+
+    if estado_id:
+        query = query.filter(models.EventoSolicitud.estado_id == estado_id)
+
+    if tipo_solicitud_id:
+        query = query.filter(models.EventoSolicitud.tipo_solicitud_id == tipo_solicitud_id)
+
+    return query.order_by(models.EventoSolicitud.id).limit(limite).all()
 
 
 # ══════════════════════════════════════════════════════════════
@@ -223,25 +461,132 @@ def finalizar_sesion_whatsapp(db: Session, sesion_id: str):
     return sesion
 
 
-def guardar_mensaje_whatsapp(db: Session, sesion_id: str, direccion: str, contenido: str):
+def guardar_mensaje_whatsapp(
+    db: Session,
+    sesion_id: str,
+    direccion: str,
+    contenido: str,
+    solicitud_id: str = None
+):
     """Guarda un mensaje de WhatsApp — direccion es ENTRANTE o SALIENTE"""
     mensaje = models.MensajeWhatsApp(
-        sesion_id = sesion_id,
-        direccion = direccion,
-        contenido = contenido
+        sesion_id    = sesion_id,
+        direccion    = direccion,
+        contenido    = contenido,
+        solicitud_id = solicitud_id
     )
     db.add(mensaje)
+
+    # Cada mensaje del usuario cuenta como actividad de la sesión
+    if direccion == "ENTRANTE":
+        db.query(models.SesionWhatsApp).filter(
+            models.SesionWhatsApp.id == sesion_id
+        ).update({"ultima_actividad": func.now()}, synchronize_session=False)
+
     db.commit()
     db.refresh(mensaje)
     return mensaje
 
+def vincular_mensajes_sesion(db: Session, sesion_id: str, solicitud_id: str):
+    """
+    Asocia a una solicitud los mensajes de la sesión que aún no tratan de
+    ninguna — la conversación que llevó a crearla o consultarla
+    """
+    db.query(models.MensajeWhatsApp).filter(
+        models.MensajeWhatsApp.sesion_id == sesion_id,
+        models.MensajeWhatsApp.solicitud_id == None
+    ).update({"solicitud_id": solicitud_id}, synchronize_session=False)
+    db.commit()
+
+
+def guardar_mensajes_salientes(db: Session, mensajes: list):
+    """
+    Agrega a la transacción actual mensajes enviados por iniciativa del sistema.
+    `mensajes` es una lista de (telefono, contenido, solicitud_id). Se asocian a
+    la sesión activa del teléfono o, si no tiene, a una sesión cerrada tipo NOTIFICACION.
+    """
+    telefonos = {telefono for telefono, _, _ in mensajes}
+    sesiones = {
+        s.telefono: s for s in db.query(models.SesionWhatsApp).filter(
+            models.SesionWhatsApp.telefono.in_(telefonos),
+            models.SesionWhatsApp.activa == True
+        ).all()
+    }
+
+    for telefono in telefonos - sesiones.keys():
+        sesion = models.SesionWhatsApp(
+            telefono      = telefono,
+            estado_sesion = "NOTIFICACION",
+            activa        = False,
+            finalizada_en = func.now()
+        )
+        db.add(sesion)
+        sesiones[telefono] = sesion
+    db.flush()  # para tener los ids de las sesiones nuevas
+
+    db.add_all([
+        models.MensajeWhatsApp(
+            sesion_id    = sesiones[telefono].id,
+            direccion    = "SALIENTE",
+            contenido    = contenido,
+            solicitud_id = solicitud_id
+        )
+        for telefono, contenido, solicitud_id in mensajes
+    ])
+
+
 def get_sesion_activa(db: Session, telefono: str):
-    """Busca si el usuario tiene una sesión activa"""
-    return db.query(models.SesionWhatsApp).filter(
+    """
+    Busca si el usuario tiene una sesión activa.
+    Si lleva más de MINUTOS_INACTIVIDAD sin mensajes se cierra aquí mismo,
+    así no dependemos de que el barrido periódico ya haya pasado.
+    """
+    limite = func.now() - timedelta(minutes=MINUTOS_INACTIVIDAD)
+    resultado = db.query(
+        models.SesionWhatsApp,
+        (models.SesionWhatsApp.ultima_actividad < limite).label("expirada")
+    ).filter(
         models.SesionWhatsApp.telefono == telefono,
         models.SesionWhatsApp.activa == True
     ).first()
 
+    if not resultado:
+        return None
+
+    sesion, expirada = resultado
+    if expirada:
+        finalizar_sesion_whatsapp(db, str(sesion.id))
+        return None
+    return sesion
+
+
+def expirar_sesiones_inactivas(db: Session, minutos: int = MINUTOS_INACTIVIDAD, lote: int = 100) -> int:
+    """
+    Cierra por lotes las sesiones activas sin mensajes en los últimos `minutos`.
+    Cada lote es una transacción corta; SKIP LOCKED hace que dos barridos a la
+    vez no se pisen. Mientras un lote no hace commit sus filas quedan bloqueadas:
+    si en ese momento llega un mensaje a una de esas sesiones, el UPDATE de
+    ultima_actividad del webhook espera a que termine ese lote (por eso son chicos).
+    """
+    limite = func.now() - timedelta(minutes=minutos)
+    total  = 0
+
+    while True:
+        ids = [id for (id,) in db.query(models.SesionWhatsApp.id).filter(
+            models.SesionWhatsApp.activa == True,
+            models.SesionWhatsApp.ultima_actividad < limite
+        ).limit(lote).with_for_update(skip_locked=True).all()]
+        if not ids:
+            break
+
+        db.query(models.SesionWhatsApp).filter(
+            models.SesionWhatsApp.id.in_(ids)
+        ).update({"activa": False, "finalizada_en": func.now()}, synchronize_session=False)
+        db.commit()
+        total += len(ids)
+
+    return total
+
 
 def actualizar_estado_sesion(db: Session, sesion_id: str, nuevo_estado: str):
     """Actualiza el estado de la sesión para recordar en qué paso está el usuario"""
@@ -251,4 +596,22 @@ def actualizar_estado_sesion(db: Session, sesion_id: str, nuevo_estado: str):
     if sesion:
         sesion.estado_sesion = nuevo_estado
         db.commit()
-    return sesion
\ No newline at end of file
+    return sesion
+
+# ══════════════════════════════════════════════════════════════
+# FUNCIONES DE ARCHIVO — conversaciones viejas
+# ══════════════════════════════════════════════════════════════
+
+def buscar_mensajes_archivados(db: Session, telefono: str, desde=None, hasta=None):
+    """Busca mensajes archivados de un teléfono, opcionalmente entre dos fechas"""
+    query = db.query(models.MensajeWhatsAppArchivo).filter(
+        models.MensajeWhatsAppArchivo.telefono == telefono
+    )
+
+    if desde:
+        query = query.filter(models.MensajeWhatsAppArchivo.creado_en >= desde)
+
+    if hasta:
+        query = query.filter(models.MensajeWhatsAppArchivo.creado_en < hasta)
+
+    return query.order_by(models.MensajeWhatsAppArchivo.creado_en).all()
@@ -1,8 +1,10 @@
 # Importamos las herramientas necesarias
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from dotenv import load_dotenv
 import os
+import threading
+import time
 
 # Le decimos a Python que lea el archivo .env
 load_dotenv()
@@ -10,12 +12,45 @@ load_dotenv()
 # Leemos la URL de conexión que escribimos en .env
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Réplica de solo lectura (opcional). Si no está, todo va a la principal
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+
+def _crear_engine(url: str, **opciones):
+    # pool_pre_ping descarta las conexiones que Supabase cerró mientras estaban quietas
+    return create_engine(
+        url,
+        pool_size     = int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow  = int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_pre_ping = True,
+        **opciones
+    )
+
+
 # Creamos el motor de conexión con Supabase
-engine = create_engine(DATABASE_URL)
+engine = _crear_engine(DATABASE_URL)
+# Si la réplica no contesta, mejor enterarse en 2 s y seguir con la principal
+engine_lectura = (
+    _crear_engine(DATABASE_REPLICA_URL, connect_args={"connect_timeout": 2})
+    if DATABASE_REPLICA_URL else engine
+)
+
+
+# Cada worker tiene su propio pool. "uvicorn --workers" (el Procfile) arranca
+# los workers con spawn: cada uno vuelve a importar este módulo y crea su engine.
+# Con servidores que usan fork después de importar la app (ej: gunicorn con
+# preload) el hijo no debe reutilizar las conexiones del padre: se descartan
+def _reiniciar_pool_en_hijo():
+    engine.dispose(close=False)
+    if engine_lectura is not engine:
+        engine_lectura.dispose(close=False)
+
+os.register_at_fork(after_in_child=_reiniciar_pool_en_hijo)
 
 # Creamos la fábrica de sesiones
 # Cada vez que la API necesite hablar con la BD abre una sesión
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=engine_lectura)
 
 # Base es la clase madre de todos nuestros modelos
 Base = declarative_base()
@@ -29,3 +64,85 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# ══════════════════════════════════════════════════════════════
+# LECTURAS EN LA RÉPLICA
+# ══════════════════════════════════════════════════════════════
+# Los listados y búsquedas pesadas pueden ir a la réplica para no competir
+# con las escrituras del webhook. Se vuelve a la principal cuando:
+# - el usuario que pregunta escribió hace menos de REPLICA_VENTANA_ESCRITURA
+#   segundos, desde la API o por WhatsApp (así ve enseguida la solicitud que
+#   acaba de crear, con cualquiera de sus tokens), o
+# - la réplica va atrasada más de REPLICA_RETRASO_MAXIMO segundos (o no responde).
+
+VENTANA_ESCRITURA = float(os.getenv("REPLICA_VENTANA_ESCRITURA", "10"))
+RETRASO_MAXIMO    = float(os.getenv("REPLICA_RETRASO_MAXIMO", "5"))
+INTERVALO_CHEQUEO = 2.0
+
+# En una base normal (ej: dos instancias locales para probar) el retraso es 0.
+# En una réplica, si dejó de recibir WAL devolvemos NULL (= atrasada): sin
+# streaming lo recibido y lo aplicado quedan iguales para siempre y parecería
+# al día. Si está recibiendo, compara lo recibido con lo aplicado.
+# El usuario de la réplica necesita pg_read_all_stats para ver pg_stat_wal_receiver.
+CONSULTA_RETRASO = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_escrituras    = {}   # id del usuario → momento de su última escritura
+_estado_replica = {"al_dia": True, "revisado_en": 0.0}
+_lock          = threading.Lock()
+_lock_chequeo  = threading.Lock()   # un solo request mide el retraso a la vez
+
+
+def registrar_escritura(usuario_id: str):
+    """Anota que el usuario acaba de escribir (lo llama el bus en cada worker)"""
+    ahora = time.monotonic()
+    with _lock:
+        _escrituras[usuario_id] = ahora
+        # Limpiamos las marcas vencidas para que el diccionario no crezca
+        for vieja in [c for c, t in _escrituras.items() if ahora - t > VENTANA_ESCRITURA]:
+            del _escrituras[vieja]
+
+
+def _escribio_hace_poco(usuario_id: str) -> bool:
+    with _lock:
+        momento = _escrituras.get(usuario_id)
+    return momento is not None and time.monotonic() - momento < VENTANA_ESCRITURA
+
+
+def _replica_al_dia() -> bool:
+    """Mide el retraso de la réplica, como mucho una vez cada INTERVALO_CHEQUEO"""
+    if time.monotonic() - _estado_replica["revisado_en"] < INTERVALO_CHEQUEO:
+        return _estado_replica["al_dia"]
+
+    # Si otro request ya está midiendo, usamos el último valor conocido
+    # en vez de abrir otra conexión contra la réplica
+    if not _lock_chequeo.acquire(blocking=False):
+        return _estado_replica["al_dia"]
+    try:
+        try:
+            with engine_lectura.connect() as conn:
+                retraso = conn.execute(CONSULTA_RETRASO).scalar()
+            al_dia = retraso is not None and float(retraso) <= RETRASO_MAXIMO
+        except Exception:
+            al_dia = False
+        _estado_replica.update(al_dia=al_dia, revisado_en=time.monotonic())
+        return al_dia
+    finally:
+        _lock_chequeo.release()
+
+
+def abrir_sesion_lectura(usuario_id: str = None) -> Session:
+    """Abre una sesión en la réplica o en la principal para las lecturas de este usuario"""
+    usar_principal = (
+        engine_lectura is engine
+        or (usuario_id and _escribio_hace_poco(usuario_id))
+        or not _replica_al_dia()
+    )
+    return SessionLocal() if usar_principal else SessionLectura()
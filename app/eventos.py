@@ -0,0 +1,38 @@
+"""
+Aviso en memoria de que hay eventos nuevos en eventos_solicitud.
+
+Los eventos en sí se guardan en la base de datos (ver crud.registrar_evento_solicitud),
+así que un cliente que se reconecta puede ponerse al día desde su último id.
+Esto solo sirve para despertar a las conexiones SSE abiertas sin que tengan
+que consultar la base de datos cada pocos segundos.
+"""
+import asyncio
+import threading
+
+
+class FeedEventos:
+    def __init__(self):
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self) -> asyncio.Event:
+        """Registra una conexión; debe llamarse desde el event loop"""
+        evento = asyncio.Event()
+        with self._lock:
+            self._suscriptores.add((asyncio.get_running_loop(), evento))
+        return evento
+
+    def desuscribir(self, evento: asyncio.Event):
+        with self._lock:
+            self._suscriptores = {(l, e) for (l, e) in self._suscriptores if e is not evento}
+
+    def notificar(self):
+        """Despierta a todas las conexiones; se puede llamar desde cualquier hilo"""
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for loop, evento in suscriptores:
+            loop.call_soon_threadsafe(evento.set)
+
+
+# Instancia única para todo el proceso
+feed = FeedEventos()
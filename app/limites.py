@@ -0,0 +1,94 @@
+"""
+Limitador de tasa tipo "token bucket" (cubeta de fichas).
+
+La cubeta se llena a `tasa` fichas por segundo hasta `capacidad`.
+Cada acción gasta una ficha; si no hay, hay que esperar o rechazarla.
+
+También incluye los límites de admisión del webhook de WhatsApp:
+una cubeta por teléfono y un tope de turnos atendiéndose a la vez.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa      = tasa
+        self.capacidad = capacidad
+        self._fichas   = capacidad
+        self._ultima   = time.monotonic()
+        self._lock     = threading.Lock()
+
+    def _recargar(self, ahora: float):
+        self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultima) * self.tasa)
+        self._ultima = ahora
+
+    def tomar(self) -> bool:
+        """Gasta una ficha si hay; devuelve False sin esperar si no hay"""
+        with self._lock:
+            self._recargar(time.monotonic())
+            if self._fichas >= 1:
+                self._fichas -= 1
+                return True
+            return False
+
+    def esperar(self):
+        """Espera lo necesario hasta poder gastar una ficha"""
+        while True:
+            with self._lock:
+                self._recargar(time.monotonic())
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                falta = (1 - self._fichas) / self.tasa
+            time.sleep(falta)
+
+
+class LimitadorPorClave:
+    """
+    Una cubeta por clave (ej: por teléfono) con memoria acotada.
+    Cada cubeta es solo una tupla (fichas, última recarga); cuando hay más
+    de `max_claves` se descarta la que lleva más tiempo sin usarse.
+    """
+    def __init__(self, tasa: float, capacidad: float, max_claves: int = 10000):
+        self.tasa       = tasa
+        self.capacidad  = capacidad
+        self.max_claves = max_claves
+        self._cubetas   = OrderedDict()
+        self._lock      = threading.Lock()
+
+    def tomar(self, clave: str) -> bool:
+        with self._lock:
+            ahora = time.monotonic()
+            fichas, ultima = self._cubetas.pop(clave, (self.capacidad, ahora))
+            fichas = min(self.capacidad, fichas + (ahora - ultima) * self.tasa)
+
+            permitido = fichas >= 1
+            if permitido:
+                fichas -= 1
+
+            # Al volver a insertarla queda al final: la más recientemente usada
+            self._cubetas[clave] = (fichas, ahora)
+            if len(self._cubetas) > self.max_claves:
+                self._cubetas.popitem(last=False)
+            return permitido
+
+
+class LimiteConcurrencia:
+    """Tope de tareas en curso a la vez; si está lleno se rechaza sin esperar"""
+    def __init__(self, maximo: int):
+        self.maximo    = maximo
+        self._en_curso = 0
+        self._lock     = threading.Lock()
+
+    def entrar(self) -> bool:
+        with self._lock:
+            if self._en_curso >= self.maximo:
+                return False
+            self._en_curso += 1
+            return True
+
+    def salir(self):
+        with self._lock:
+            self._en_curso -= 1
@@ -1,24 +1,127 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import PlainTextResponse
-from twilio.twiml.messaging_response import MessagingResponse
+from fastapi import FastAPI, Depends, HTTPException, Request, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app import crud, schemas, models
-from jose import jwt
+from app.database import get_db, SessionLocal, engine, engine_lectura
+from app.database import abrir_sesion_lectura, registrar_escritura
+from app import crud, schemas
+from app.bus import bus
+from app.cache import cache
+from app.eventos import feed
+from app.limites import LimitadorPorClave, LimiteConcurrencia
+from app import twiml
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
+from uuid import UUID
+import asyncio
+import logging
 import os
 
-load_dotenv()
-
+# Las variables del .env ya las cargó app.database al importarse
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
-app = FastAPI(title="Sistema de Solicitudes Académicas")
+logger = logging.getLogger(__name__)
+
+# ── Control de admisión del webhook de WhatsApp ──────────────
+# Cada teléfono puede mandar WEBHOOK_MENSAJES_POR_MINUTO (con ráfagas de
+# WEBHOOK_RAFAGA) y se atienden a lo sumo WEBHOOK_MAX_EN_CURSO turnos a la vez.
+# Los valores del .env son para todo el servicio: cada worker lleva sus propias
+# cuentas en memoria, así que se reparten entre los WEB_CONCURRENCY workers
+# (los mensajes de un teléfono caen en cualquiera de ellos).
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def por_worker(total: float) -> float:
+    """La parte de un límite total que le toca a este worker"""
+    return total / WORKERS
+
+
+limite_por_telefono = LimitadorPorClave(
+    tasa       = por_worker(float(os.getenv("WEBHOOK_MENSAJES_POR_MINUTO", "20")) / 60),
+    capacidad  = max(1, por_worker(float(os.getenv("WEBHOOK_RAFAGA", "5")))),
+    max_claves = int(os.getenv("WEBHOOK_MAX_TELEFONOS", "10000"))
+)
+limite_en_curso = LimiteConcurrencia(max(1, int(por_worker(int(os.getenv("WEBHOOK_MAX_EN_CURSO", "20"))))))
+
+RESPUESTA_OCUPADO = twiml.renderizar(
+    "⏳ En este momento estamos atendiendo muchas consultas. "
+    "Por favor escribe de nuevo en un minuto."
+)
+
+
+# ══════════════════════════════════════════════════════════════
+# ARRANQUE Y APAGADO DE CADA WORKER
+# ══════════════════════════════════════════════════════════════
+
+# ── Avisos que llegan por el bus desde cualquier worker ───────
+def recibir_aviso(mensaje: str):
+    if mensaje == "eventos":
+        feed.notificar()
+    elif mensaje.startswith("cache:"):
+        cache.invalidar(mensaje[len("cache:"):])
+    elif mensaje.startswith("escritura:"):
+        registrar_escritura(mensaje[len("escritura:"):])
+
+
+# ── Calentamiento: lo hacemos antes de aceptar tráfico ───────
+# así la primera petición no paga la conexión ni la configuración del ORM.
+# Es solo una ayuda: si la base no responde al arrancar lo anotamos y el
+# worker arranca igual (las conexiones se abrirán con las primeras peticiones),
+# en vez de caerse y quedar reiniciándose en bucle.
+def abrir_pool(motor):
+    """Abre a la vez todas las conexiones fijas del pool y las devuelve"""
+    conexiones = []
+    try:
+        for _ in range(motor.pool.size()):
+            conexiones.append(motor.connect())
+        for conn in conexiones:
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conexiones:
+            conn.close()
+
+
+def calentar():
+    configure_mappers()
+
+    try:
+        abrir_pool(engine)
+        db = SessionLocal()
+        try:
+            crud.get_tipos_solicitud(db)
+            crud.get_estados(db)
+        finally:
+            db.close()
+    except Exception:
+        logger.exception("No se pudo calentar la base principal, se arranca sin calentar")
+
+    if engine_lectura is not engine:
+        try:
+            abrir_pool(engine_lectura)
+        except Exception:
+            logger.exception("No se pudo calentar la réplica, se arranca sin calentar")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    bus.suscribir(recibir_aviso)
+    bus.iniciar()
+    await run_in_threadpool(calentar)
+    yield
+    bus.detener()
+    engine.dispose()
+    engine_lectura.dispose()
+
+
+app = FastAPI(title="Sistema de Solicitudes Académicas", lifespan=lifespan)
 
 
 # ── Función para crear token JWT ──────────────────────────────
 def crear_token(data: dict):
+    from jose import jwt  # se importa al primer uso para acelerar el arranque
     datos = data.copy()
     expiracion = datetime.utcnow() + timedelta(hours=8)
     datos.update({"exp": expiracion})
@@ -27,6 +130,7 @@ def crear_token(data: dict):
 
 # ── Función para obtener usuario del token ────────────────────
 def get_usuario_actual(token: str, db: Session):
+    from jose import jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         usuario_id = payload.get("sub")
@@ -35,6 +139,40 @@ def get_usuario_actual(token: str, db: Session):
         raise HTTPException(status_code=401, detail="Token inválido")
 
 
+# ── Id del usuario del token, sin ir a la BD ──────────────────
+# Devuelve None si el token no es válido (el endpoint igual lo rechaza después)
+def usuario_id_del_token(token: str):
+    from jose import jwt
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except Exception:
+        return None
+
+
+# ── Igual que get_db, pero para endpoints de solo lectura ─────
+# Van a la réplica salvo que el usuario haya escrito hace poco
+def get_db_lectura(token: str = None):
+    db = abrir_sesion_lectura(usuario_id_del_token(token) if token else None)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# ── Marca que este usuario acaba de escribir ──────────────────
+# Durante unos segundos sus lecturas irán a la BD principal (no a la réplica)
+# para que vea lo que acaba de guardar. Se avisa a todos los workers.
+def marcar_escritura(usuario_id: str):
+    # Primero en este worker, así la próxima lectura del usuario ya va a la
+    # principal aunque el bus falle; el bus solo avisa a los demás workers
+    usuario_id = str(usuario_id)
+    registrar_escritura(usuario_id)
+    try:
+        bus.publicar("escritura:" + usuario_id)
+    except Exception:
+        logger.exception("No se pudo avisar la escritura a los demás workers")
+
+
 # ══════════════════════════════════════════════════════════════
 # ENDPOINTS DE INICIO
 # ══════════════════════════════════════════════════════════════
@@ -74,17 +212,19 @@ def login(datos: schemas.LoginRequest, db: Session = Depends(get_db)):
 @app.post("/solicitudes", response_model=schemas.SolicitudOut)
 def crear_solicitud(solicitud: schemas.SolicitudCreate, token: str, db: Session = Depends(get_db)):
     usuario = get_usuario_actual(token, db)
-    return crud.crear_solicitud(db, solicitud, usuario.id)
+    nueva = crud.crear_solicitud(db, solicitud, usuario.id)
+    marcar_escritura(usuario.id)
+    return nueva
 
 
 @app.get("/solicitudes", response_model=list[schemas.SolicitudOut])
-def ver_todas_solicitudes(token: str, db: Session = Depends(get_db)):
+def ver_todas_solicitudes(token: str, db: Session = Depends(get_db_lectura)):
     usuario = get_usuario_actual(token, db)
     return crud.get_todas_solicitudes(db)
 
 
 @app.get("/solicitudes/mis-solicitudes", response_model=list[schemas.SolicitudOut])
-def mis_solicitudes(token: str, db: Session = Depends(get_db)):
+def mis_solicitudes(token: str, db: Session = Depends(get_db_lectura)):
     usuario = get_usuario_actual(token, db)
     return crud.get_solicitudes_por_usuario(db, usuario.id)
 
@@ -95,16 +235,77 @@ def buscar_solicitudes(
     estado_id: int = None,
     tipo_solicitud_id: int = None,
     canal_origen: str = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_lectura)
 ):
     usuario = get_usuario_actual(token, db)
     return crud.buscar_solicitudes(db, estado_id, tipo_solicitud_id, canal_origen)
 
 
+# ── Feed de eventos (Server-Sent Events) ─────────────────────
+# Reemplaza el sondeo de /solicitudes cada pocos segundos.
+# El navegador se conecta con: new EventSource("/solicitudes/eventos?token=...")
+# y al reconectarse manda solo el encabezado Last-Event-ID para ponerse al día.
+
+def leer_eventos(desde: int, estado_id: int, tipo_solicitud_id: int):
+    db = SessionLocal()
+    try:
+        if desde is None:
+            return crud.get_ultimo_evento_id(db), []
+        eventos = crud.get_eventos_desde(db, desde, estado_id, tipo_solicitud_id)
+        return desde, [schemas.EventoSolicitudOut.model_validate(e) for e in eventos]
+    finally:
+        db.close()
+
+
+async def generar_eventos(request: Request, desde: int, estado_id: int, tipo_solicitud_id: int):
+    aviso = feed.suscribir()
+    try:
+        while not await request.is_disconnected():
+            aviso.clear()
+            desde, eventos = await run_in_threadpool(leer_eventos, desde, estado_id, tipo_solicitud_id)
+            for evento in eventos:
+                desde = evento.id
+                yield f"id: {evento.id}\nevent: {evento.tipo_evento}\ndata: {evento.model_dump_json()}\n\n"
+            if eventos:
+                continue
+            try:
+                await asyncio.wait_for(aviso.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"  # mantiene viva la conexión a través de proxies
+    finally:
+        feed.desuscribir(aviso)
+
+
+@app.get("/solicitudes/eventos")
+def feed_solicitudes(
+    request: Request,
+    token: str,
+    estado_id: int = None,
+    tipo_solicitud_id: int = None,
+    desde: int = None
+):
+    # Sesión corta solo para autenticar: si usáramos Depends(get_db) la conexión
+    # quedaría tomada del pool mientras el stream siga abierto
+    db = SessionLocal()
+    try:
+        usuario = get_usuario_actual(token, db)
+    finally:
+        db.close()
+
+    ultimo_id = request.headers.get("last-event-id")
+    if ultimo_id and ultimo_id.isdigit():
+        desde = int(ultimo_id)
+    return StreamingResponse(
+        generar_eventos(request, desde, estado_id, tipo_solicitud_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/solicitudes/{solicitud_id}", response_model=schemas.SolicitudOut)
-def ver_solicitud(solicitud_id: str, token: str, db: Session = Depends(get_db)):
+def ver_solicitud(solicitud_id: UUID, token: str, db: Session = Depends(get_db_lectura)):
     usuario = get_usuario_actual(token, db)
-    solicitud = crud.get_solicitud_por_id(db, solicitud_id)
+    solicitud = crud.get_solicitud_por_id(db, str(solicitud_id))
     if not solicitud:
         raise HTTPException(status_code=404, detail="Solicitud no encontrada")
     return solicitud
@@ -112,24 +313,43 @@ def ver_solicitud(solicitud_id: str, token: str, db: Session = Depends(get_db)):
 
 @app.patch("/solicitudes/{solicitud_id}/estado", response_model=schemas.SolicitudOut)
 def actualizar_estado(
-    solicitud_id: str,
+    solicitud_id: UUID,
     datos: schemas.SolicitudUpdateEstado,
     token: str,
     db: Session = Depends(get_db)
 ):
     usuario = get_usuario_actual(token, db)
     solicitud = crud.actualizar_estado_solicitud(
-        db, solicitud_id, datos.estado_id, usuario.id, datos.comentario
+        db, str(solicitud_id), datos.estado_id, usuario.id, datos.comentario
     )
     if not solicitud:
         raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    # Lo verán enseguida quien la cambió y el solicitante
+    marcar_escritura(usuario.id)
+    marcar_escritura(solicitud.solicitante_id)
     return solicitud
 
 
 @app.get("/solicitudes/{solicitud_id}/historial", response_model=list[schemas.HistorialOut])
-def ver_historial(solicitud_id: str, token: str, db: Session = Depends(get_db)):
+def ver_historial(solicitud_id: UUID, token: str, db: Session = Depends(get_db_lectura)):
+    usuario = get_usuario_actual(token, db)
+    return crud.get_historial_solicitud(db, str(solicitud_id))
+
+
+@app.get("/solicitudes/{solicitud_id}/timeline", response_model=schemas.TimelineOut)
+def ver_timeline(
+    solicitud_id: UUID,
+    token: str,
+    cursor: str = None,
+    limite: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_db_lectura)
+):
     usuario = get_usuario_actual(token, db)
-    return crud.get_historial_solicitud(db, solicitud_id)
+    try:
+        eventos, siguiente = crud.get_timeline_solicitud(db, str(solicitud_id), cursor, limite)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return {"eventos": eventos, "siguiente_cursor": siguiente}
 
 
 # ══════════════════════════════════════════════════════════════
@@ -138,12 +358,12 @@ def ver_historial(solicitud_id: str, token: str, db: Session = Depends(get_db)):
 
 @app.get("/tipos-solicitud", response_model=list[schemas.TipoSolicitudOut])
 def ver_tipos_solicitud(db: Session = Depends(get_db)):
-    return db.query(models.TipoSolicitud).all()
+    return crud.get_tipos_solicitud(db)
 
 
 @app.get("/estados", response_model=list[schemas.EstadoOut])
 def ver_estados(db: Session = Depends(get_db)):
-    return db.query(models.Estado).all()
+    return crud.get_estados(db)
 
 # ══════════════════════════════════════════════════════════════
 # FUNCIÓN DEL ASISTENTE VIRTUAL CON MEMORIA DE SESIÓN
@@ -263,6 +483,8 @@ def procesar_mensaje(mensaje: str, telefono: str, db: Session, sesion) -> str:
         from app.schemas import SolicitudCreate
         nueva = SolicitudCreate(tipo_solicitud_id=tipo_id, descripcion=mensaje)
         solicitud = crud.crear_solicitud(db, nueva, str(usuario.id))
+        marcar_escritura(usuario.id)
+        crud.vincular_mensajes_sesion(db, str(sesion.id), solicitud.id)
 
         crud.actualizar_estado_sesion(db, str(sesion.id), "MENU_PRINCIPAL")
         return (
@@ -281,6 +503,7 @@ def procesar_mensaje(mensaje: str, telefono: str, db: Session, sesion) -> str:
             crud.actualizar_estado_sesion(db, str(sesion.id), "MENU_PRINCIPAL")
             if not solicitud:
                 return f"❌ No encontré la solicitud *{codigo}*. Verifica el código."
+            crud.vincular_mensajes_sesion(db, str(sesion.id), solicitud.id)
             return (
                 f"📄 *{solicitud.codigo_referencia}*\n\n"
                 f"Tipo: {solicitud.tipo_solicitud.nombre}\n"
@@ -307,26 +530,53 @@ def procesar_mensaje(mensaje: str, telefono: str, db: Session, sesion) -> str:
 # ENDPOINT WEBHOOK
 # ══════════════════════════════════════════════════════════════
 
+def respuesta_twiml(xml: str) -> PlainTextResponse:
+    return PlainTextResponse(xml, media_type="application/xml")
+
+
+def atender_whatsapp(mensaje_entrante: str, telefono: str) -> str:
+    """Un turno completo de conversación; corre en un hilo aparte"""
+    db = SessionLocal()
+    try:
+        # Buscar sesión activa o crear una nueva
+        sesion = crud.get_sesion_activa(db, telefono)
+        if not sesion:
+            sesion = crud.crear_sesion_whatsapp(db, telefono)
+
+        # Guardar mensaje entrante
+        entrante = crud.guardar_mensaje_whatsapp(db, str(sesion.id), "ENTRANTE", mensaje_entrante)
+
+        # Procesar y responder
+        respuesta_texto = procesar_mensaje(mensaje_entrante, telefono, db, sesion)
+
+        # Guardar respuesta — trata de la misma solicitud que el mensaje que responde
+        crud.guardar_mensaje_whatsapp(
+            db, str(sesion.id), "SALIENTE", respuesta_texto, entrante.solicitud_id
+        )
+        return respuesta_texto
+    finally:
+        db.close()
+
+
 @app.post("/whatsapp", response_class=PlainTextResponse)
-async def whatsapp_webhook(request: Request, db: Session = Depends(get_db)):
+async def whatsapp_webhook(request: Request):
     form = await request.form()
     mensaje_entrante = form.get("Body", "").strip()
     telefono         = form.get("From", "").replace("whatsapp:", "")
 
-    # Buscar sesión activa o crear una nueva
-    sesion = crud.get_sesion_activa(db, telefono)
-    if not sesion:
-        sesion = crud.crear_sesion_whatsapp(db, telefono)
-
-    # Guardar mensaje entrante
-    crud.guardar_mensaje_whatsapp(db, str(sesion.id), "ENTRANTE", mensaje_entrante)
-
-    # Procesar y responder
-    respuesta_texto = procesar_mensaje(mensaje_entrante, telefono, db, sesion)
+    # Control de admisión — se decide antes de tocar la base de datos.
+    # Primero el tope global: un mensaje rechazado por estar ocupados no
+    # debe gastar las fichas del teléfono
+    if not limite_en_curso.entrar():
+        return respuesta_twiml(RESPUESTA_OCUPADO)
+    try:
+        # Si un número se pasa de su límite (ej: un bot en bucle) no le
+        # contestamos: responderle solo alimentaría el bucle
+        if not limite_por_telefono.tomar(telefono):
+            return respuesta_twiml(twiml.RESPUESTA_VACIA)
 
-    # Guardar respuesta
-    crud.guardar_mensaje_whatsapp(db, str(sesion.id), "SALIENTE", respuesta_texto)
+        respuesta_texto = await run_in_threadpool(atender_whatsapp, mensaje_entrante, telefono)
+    finally:
+        limite_en_curso.salir()
 
-    resp = MessagingResponse()
-    resp.message(respuesta_texto)
-    return PlainTextResponse(str(resp), media_type="application/xml")
\ No newline at end of file
+    return respuesta_twiml(twiml.renderizar(respuesta_texto))
\ No newline at end of file
@@ -1,10 +1,35 @@
-from sqlalchemy import Column, String, Integer, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, Text, DateTime, ForeignKey, Uuid, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+import os
+import time
 import uuid
 
 
+# ── IDs ordenados por tiempo (UUIDv7) ────────────────────────
+# Los uuid4 son aleatorios y reparten los INSERT por todo el índice.
+# Un UUIDv7 empieza con los milisegundos actuales, así que los registros
+# nuevos caen al final del B-tree (o muy cerca). Ojo: dentro del mismo
+# milisegundo el resto es aleatorio, así que esos ids NO salen en orden;
+# para ordenar por tiempo de verdad usar creado_en.
+# Se guardan en columnas UUID nativas (16 bytes) en lugar de texto de 36.
+def generar_uuid7() -> str:
+    ms = time.time_ns() // 1_000_000
+    aleatorio = int.from_bytes(os.urandom(10), "big")
+    valor = (ms & ((1 << 48) - 1)) << 80          # 48 bits de timestamp
+    valor |= 0x7 << 76                             # versión 7
+    valor |= (aleatorio >> 68) << 64               # 12 bits aleatorios
+    valor |= 0b10 << 62                            # variante RFC 4122
+    valor |= aleatorio & ((1 << 62) - 1)           # 62 bits aleatorios
+    return str(uuid.UUID(int=valor))
+
+
+# Tipo de columna para los IDs: UUID nativo en Postgres.
+# as_uuid=False para que en Python sigan siendo strings como antes
+IdUUID = Uuid(as_uuid=False)
+
+
 # ── CLASE: Rol ───────────────────────────────────────────────
 # Representa la tabla "roles" en la base de datos
 class Rol(Base):
@@ -23,7 +48,7 @@ class Rol(Base):
 class Usuario(Base):
     __tablename__ = "usuarios"
 
-    id                = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id                = Column(IdUUID, primary_key=True, default=generar_uuid7)
     nombres           = Column(String(100), nullable=False)
     apellidos         = Column(String(100), nullable=False)
     email             = Column(String(150), unique=True, nullable=False)
@@ -73,9 +98,9 @@ class Estado(Base):
 class Solicitud(Base):
     __tablename__ = "solicitudes"
 
-    id                = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id                = Column(IdUUID, primary_key=True, default=generar_uuid7)
     codigo_referencia = Column(String(20), unique=True)
-    solicitante_id    = Column(String, ForeignKey("usuarios.id"), nullable=False)
+    solicitante_id    = Column(IdUUID, ForeignKey("usuarios.id"), nullable=False, index=True)
     tipo_solicitud_id = Column(Integer, ForeignKey("tipos_solicitud.id"), nullable=False)
     estado_id         = Column(Integer, ForeignKey("estados.id"), nullable=False)
     descripcion       = Column(Text, nullable=False)
@@ -97,10 +122,10 @@ class HistorialEstado(Base):
     __tablename__ = "historial_estados"
 
     id                 = Column(Integer, primary_key=True, index=True)
-    solicitud_id       = Column(String, ForeignKey("solicitudes.id"), nullable=False)
+    solicitud_id       = Column(IdUUID, ForeignKey("solicitudes.id"), nullable=False)
     estado_anterior_id = Column(Integer, ForeignKey("estados.id"))
     estado_nuevo_id    = Column(Integer, ForeignKey("estados.id"), nullable=False)
-    usuario_id         = Column(String, ForeignKey("usuarios.id"), nullable=False)
+    usuario_id         = Column(IdUUID, ForeignKey("usuarios.id"), nullable=False)
     comentario         = Column(Text)
     creado_en          = Column(DateTime, server_default=func.now())
 
@@ -108,23 +133,36 @@ class HistorialEstado(Base):
     solicitud    = relationship("Solicitud", back_populates="historial")
     estado_nuevo = relationship("Estado", foreign_keys=[estado_nuevo_id])
 
+    __table_args__ = (
+        # Sirve tanto para filtrar por solicitud como para recorrerla en orden
+        Index("ix_historial_estados_solicitud_creado", "solicitud_id", "creado_en"),
+    )
+
 
 # ── CLASE: SesionWhatsApp ─────────────────────────────────────
 # Guarda el inicio y fin de cada conversación por WhatsApp
 class SesionWhatsApp(Base):
     __tablename__ = "sesiones_whatsapp"
 
-    id            = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    usuario_id    = Column(String, ForeignKey("usuarios.id"))
+    id            = Column(IdUUID, primary_key=True, default=generar_uuid7)
+    usuario_id    = Column(IdUUID, ForeignKey("usuarios.id"))
     telefono      = Column(String(20), nullable=False)
     estado_sesion = Column(String(30), default="INICIO")
     iniciada_en   = Column(DateTime, server_default=func.now())
     finalizada_en = Column(DateTime)
     activa        = Column(Boolean, default=True)
+    # Se actualiza con cada mensaje entrante; sirve para expirar sesiones abandonadas
+    ultima_actividad = Column(DateTime, server_default=func.now(), nullable=False)
 
     # Una sesión tiene muchos mensajes
     mensajes = relationship("MensajeWhatsApp", back_populates="sesion")
 
+    __table_args__ = (
+        # Solo indexamos las activas: son las únicas que busca el barrido
+        Index("ix_sesiones_whatsapp_activa_actividad", "ultima_actividad",
+              postgresql_where=text("activa")),
+    )
+
 
 # ── CLASE: MensajeWhatsApp ────────────────────────────────────
 # Guarda cada mensaje enviado y recibido por WhatsApp
@@ -132,14 +170,113 @@ class MensajeWhatsApp(Base):
     __tablename__ = "mensajes_whatsapp"
 
     id        = Column(Integer, primary_key=True, index=True)
-    sesion_id = Column(String, ForeignKey("sesiones_whatsapp.id"), nullable=False)
+    sesion_id = Column(IdUUID, ForeignKey("sesiones_whatsapp.id"), nullable=False, index=True)
     direccion = Column(String(10), nullable=False)  # ENTRANTE o SALIENTE
     contenido = Column(Text, nullable=False)
-    creado_en = Column(DateTime, server_default=func.now())
+    creado_en = Column(DateTime, server_default=func.now(), index=True)
+    # Solicitud de la que trata el mensaje (si trata de alguna) — para la línea de tiempo
+    solicitud_id = Column(IdUUID, ForeignKey("solicitudes.id"))
 
     # Un mensaje pertenece a una sesión
     sesion = relationship("SesionWhatsApp", back_populates="mensajes")
 
+    __table_args__ = (
+        Index("ix_mensajes_whatsapp_solicitud_creado", "solicitud_id", "creado_en",
+              postgresql_where=text("solicitud_id IS NOT NULL")),
+    )
+
+
+# ── CLASE: EventoSolicitud ────────────────────────────────────
+# Registro de cambios de las solicitudes para el feed de los paneles.
+# El id sirve de "offset": un cliente reconectado pide los eventos > id.
+class EventoSolicitud(Base):
+    __tablename__ = "eventos_solicitud"
+
+    id                = Column(Integer, primary_key=True, index=True)
+    solicitud_id      = Column(IdUUID, ForeignKey("solicitudes.id"), nullable=False)
+    tipo_evento       = Column(String(20), nullable=False)  # CREADA o CAMBIO_ESTADO
+    estado_id         = Column(Integer, ForeignKey("estados.id"), nullable=False)
+    tipo_solicitud_id = Column(Integer, ForeignKey("tipos_solicitud.id"), nullable=False)
+    creado_en         = Column(DateTime, server_default=func.now())
+
+# ── CLASE: NotificacionSaliente ───────────────────────────────
+# Bandeja de salida de los avisos por WhatsApp al solicitante.
+# Se escribe en la misma transacción que el cambio de estado y la envía
+# un único proceso aparte (python -m app.tareas notificar), así que los
+# avisos sobreviven a reinicios y el límite de envío es global.
+class NotificacionSaliente(Base):
+    __tablename__ = "notificaciones_salientes"
+
+    id                = Column(Integer, primary_key=True, index=True)
+    solicitud_id      = Column(IdUUID, ForeignKey("solicitudes.id"), nullable=False)
+    telefono          = Column(String(20), nullable=False)
+    texto             = Column(Text, nullable=False)
+    estado            = Column(String(20), nullable=False, default="PENDIENTE")  # PENDIENTE, ENVIADA o FALLIDA
+    # Sube cada vez que un cambio nuevo reemplaza el texto pendiente
+    version           = Column(Integer, nullable=False, default=1)
+    intentos          = Column(Integer, nullable=False, default=0)
+    enviar_despues_de = Column(DateTime, nullable=False)
+    creado_en         = Column(DateTime, server_default=func.now())
+    enviada_en        = Column(DateTime)
+
+    __table_args__ = (
+        # Una sola pendiente por solicitud: los cambios seguidos se juntan en ella
+        Index("ux_notificaciones_pendiente_por_solicitud", "solicitud_id", unique=True,
+              postgresql_where=text("estado = 'PENDIENTE'")),
+        Index("ix_notificaciones_pendientes", "enviar_despues_de",
+              postgresql_where=text("estado = 'PENDIENTE'")),
+    )
+
+# ══════════════════════════════════════════════════════════════
+# TABLAS DE ARCHIVO (capa fría)
+# ══════════════════════════════════════════════════════════════
+# Las conversaciones viejas se mueven aquí con "python -m app.tareas archivar"
+# para que las tablas calientes del webhook se mantengan pequeñas.
+# No tienen llaves foráneas: son solo de consulta ocasional, por teléfono y fecha.
+
+# ── CLASE: SesionWhatsAppArchivo ──────────────────────────────
+class SesionWhatsAppArchivo(Base):
+    __tablename__ = "sesiones_whatsapp_archivo"
+
+    id            = Column(IdUUID, primary_key=True)
+    usuario_id    = Column(IdUUID)
+    telefono      = Column(String(20), nullable=False)
+    estado_sesion = Column(String(30))
+    iniciada_en   = Column(DateTime)
+    finalizada_en = Column(DateTime)
+    archivada_en  = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_sesiones_archivo_telefono_iniciada", "telefono", "iniciada_en"),
+    )
+
+
+# ── CLASE: MensajeWhatsAppArchivo ─────────────────────────────
+# Guarda también el teléfono para no tener que unir con las sesiones.
+# Está particionada por mes de creado_en: las consultas por fecha solo leen
+# las particiones del rango y un mes viejo se puede soltar con DROP TABLE.
+# Las particiones las crea el trabajo de archivo (ver app/tareas.py).
+class MensajeWhatsAppArchivo(Base):
+    __tablename__ = "mensajes_whatsapp_archivo"
+
+    id           = Column(Integer, primary_key=True, autoincrement=False)
+    sesion_id    = Column(IdUUID, nullable=False)
+    telefono     = Column(String(20), nullable=False)
+    direccion    = Column(String(10), nullable=False)
+    contenido    = Column(Text, nullable=False)
+    # Postgres exige que la llave de partición sea parte de la llave primaria
+    creado_en    = Column(DateTime, primary_key=True)
+    solicitud_id = Column(IdUUID)
+    archivado_en = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_mensajes_archivo_telefono_creado", "telefono", "creado_en"),
+        # Para la línea de tiempo de cada solicitud
+        Index("ix_mensajes_archivo_solicitud_creado", "solicitud_id", "creado_en",
+              postgresql_where=text("solicitud_id IS NOT NULL")),
+        {"postgresql_partition_by": "RANGE (creado_en)"},
+    )
+
 
 #     {
 #   "nombres": "luz",
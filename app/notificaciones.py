@@ -0,0 +1,162 @@
+"""
+Notificaciones por WhatsApp cuando una solicitud cambia de estado.
+
+crud.actualizar_estado_solicitud deja el aviso en la tabla
+notificaciones_salientes, dentro de la misma transacción del cambio.
+Un único proceso (python -m app.tareas notificar, ver Procfile) la vacía:
+- los cambios de una misma solicitud dentro de NOTIF_VENTANA_SEGUNDOS ya
+  llegan juntos en una sola fila (si pasa de EN_REVISION a APROBADA en
+  5 segundos solo se avisa lo último),
+- envía respetando el límite de mensajes por segundo del proveedor,
+- reintenta con espera creciente si el envío falla,
+- y guarda los mensajes enviados como SALIENTE en un solo commit por lote.
+
+Como la cola vive en la base de datos, un reinicio o un apagado por
+inactividad no pierde avisos, y al haber un solo emisor el límite de
+envío es global aunque la API corra con varios workers.
+
+Si por un momento corren dos notificadores (un deploy que se solapa, o
+alguien que escala el proceso a 2) no se duplican avisos: cada uno toma
+sus filas con FOR UPDATE SKIP LOCKED y les corre enviar_despues_de
+PLAZO_ENVIO segundos antes de enviar, así el otro no las ve. Si el
+proceso muere a mitad de un envío, la fila vuelve a salir al vencer el
+plazo. Lo que sí se suma mientras se solapan es el ritmo de envío.
+"""
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from datetime import timedelta
+from app.limites import TokenBucket
+from app import crud, models
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+MENSAJES_POR_SEG = float(os.getenv("NOTIF_MENSAJES_POR_SEGUNDO", "1"))
+REINTENTOS       = 3
+TAMANO_LOTE      = 20
+PLAZO_ENVIO      = 120   # segundos que una fila tomada queda reservada; cubre un lote entero
+
+
+# ══════════════════════════════════════════════════════════════
+# EMISORES — quién entrega el mensaje
+# ══════════════════════════════════════════════════════════════
+
+class EmisorTwilio:
+    def __init__(self):
+        self.cliente = None
+        self.numero  = os.getenv("TWILIO_WHATSAPP_NUMBER")
+
+    def enviar(self, telefono: str, texto: str):
+        if self.cliente is None:
+            # El SDK de Twilio es pesado: solo se carga con el primer envío
+            from twilio.rest import Client
+            self.cliente = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+        self.cliente.messages.create(from_=self.numero, to=f"whatsapp:{telefono}", body=texto)
+
+
+class EmisorLocal:
+    """No envía nada: guarda los mensajes en una lista (pruebas y desarrollo)"""
+    def __init__(self):
+        self.enviados = []
+
+    def enviar(self, telefono: str, texto: str):
+        self.enviados.append((telefono, texto))
+
+
+def crear_emisor():
+    """Usa Twilio si hay credenciales configuradas, si no el emisor local"""
+    if os.getenv("TWILIO_ACCOUNT_SID") and os.getenv("TWILIO_AUTH_TOKEN"):
+        return EmisorTwilio()
+    return EmisorLocal()
+
+
+# ══════════════════════════════════════════════════════════════
+# ENVÍO DE LA BANDEJA DE SALIDA
+# ══════════════════════════════════════════════════════════════
+
+def enviar_pendientes(db: Session, emisor, limitador: TokenBucket, lote: int = TAMANO_LOTE) -> int:
+    """
+    Envía un lote de notificaciones vencidas; devuelve cuántas tomó.
+    Mientras se envía no queda ninguna transacción abierta: se toman las
+    filas en una transacción corta y los resultados se guardan en un solo commit.
+    """
+    notificacion = models.NotificacionSaliente
+    pendientes = [
+        (n.id, n.version, n.intentos, n.solicitud_id, n.telefono, n.texto)
+        for n in db.query(notificacion).filter(
+            notificacion.estado == "PENDIENTE",
+            notificacion.enviar_despues_de <= func.now()
+        ).order_by(notificacion.enviar_despues_de).limit(lote).with_for_update(skip_locked=True).all()
+    ]
+    if not pendientes:
+        db.rollback()
+        return 0
+
+    # Las reservamos antes de soltar el bloqueo: otro notificador no las
+    # verá vencidas hasta que pase PLAZO_ENVIO
+    db.execute(
+        update(notificacion).where(
+            notificacion.id.in_([id for id, *_ in pendientes])
+        ).values(enviar_despues_de=func.now() + timedelta(seconds=PLAZO_ENVIO))
+    )
+    db.commit()
+
+    enviadas, fallidas = [], []
+    for pendiente in pendientes:
+        id, version, intentos, solicitud_id, telefono, texto = pendiente
+        limitador.esperar()
+        try:
+            emisor.enviar(telefono, texto)
+            enviadas.append(pendiente)
+        except Exception:
+            logger.exception("No se pudo notificar a %s (intento %d)", telefono, intentos + 1)
+            fallidas.append(pendiente)
+
+    for id, version, intentos, solicitud_id, telefono, texto in enviadas:
+        # Solo se marca ENVIADA si nadie cambió el texto mientras se enviaba;
+        # si cambió, sigue PENDIENTE, se le quita la reserva y sale el texto
+        # nuevo en la próxima vuelta
+        db.execute(
+            update(notificacion).where(
+                notificacion.id == id,
+                notificacion.version == version
+            ).values(estado="ENVIADA", enviada_en=func.now())
+        )
+        db.execute(
+            update(notificacion).where(
+                notificacion.id == id,
+                notificacion.version != version
+            ).values(enviar_despues_de=func.now())
+        )
+
+    for id, version, intentos, solicitud_id, telefono, texto in fallidas:
+        db.execute(
+            update(notificacion).where(notificacion.id == id).values(
+                intentos          = intentos + 1,
+                estado            = "FALLIDA" if intentos + 1 > REINTENTOS else "PENDIENTE",
+                enviar_despues_de = func.now() + timedelta(seconds=10 * 2 ** intentos)
+            )
+        )
+
+    if enviadas:
+        crud.guardar_mensajes_salientes(
+            db, [(telefono, texto, solicitud_id) for _, _, _, solicitud_id, telefono, texto in enviadas]
+        )
+    db.commit()
+    return len(pendientes)
+
+
+def procesar_bandeja(db: Session, emisor=None, espera: float = 1.0):
+    """Bucle del proceso notificador; no termina"""
+    emisor    = emisor or crear_emisor()
+    limitador = TokenBucket(MENSAJES_POR_SEG, max(1, MENSAJES_POR_SEG))
+    while True:
+        try:
+            if enviar_pendientes(db, emisor, limitador):
+                continue
+        except Exception:
+            logger.exception("Error procesando la bandeja de notificaciones")
+            db.rollback()
+        time.sleep(espera)
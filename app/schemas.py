@@ -101,6 +101,41 @@ class HistorialOut(BaseModel):
         from_attributes = True
 
 
+# ── SCHEMAS DE LÍNEA DE TIEMPO ────────────────────────────────
+# Une el historial de estados y los mensajes de WhatsApp de una solicitud.
+# Según la fuente vienen llenos unos campos u otros.
+
+class EventoTimelineOut(BaseModel):
+    fuente: str                               # HISTORIAL o WHATSAPP
+    id: int
+    creado_en: datetime
+    estado_nuevo: Optional[EstadoOut] = None  # solo HISTORIAL
+    comentario: Optional[str] = None          # solo HISTORIAL
+    direccion: Optional[str] = None           # solo WHATSAPP
+    contenido: Optional[str] = None           # solo WHATSAPP
+
+    class Config:
+        from_attributes = True
+
+class TimelineOut(BaseModel):
+    eventos: list[EventoTimelineOut]
+    siguiente_cursor: Optional[str] = None
+
+
+# ── SCHEMAS DE EVENTOS ────────────────────────────────────────
+
+class EventoSolicitudOut(BaseModel):
+    id: int
+    solicitud_id: UUID
+    tipo_evento: str
+    estado_id: int
+    tipo_solicitud_id: int
+    creado_en: datetime
+
+    class Config:
+        from_attributes = True
+
+
 # ── SCHEMAS DE WHATSAPP ───────────────────────────────────────
 
 class MensajeEntranteWhatsApp(BaseModel):
@@ -0,0 +1,178 @@
+"""
+Tareas de mantenimiento que se ejecutan fuera del webhook.
+
+Uso:
+    python -m app.tareas archivar --dias 90
+    python -m app.tareas expirar --minutos 30 --cada 300
+    python -m app.tareas invalidar catalogos
+    python -m app.tareas notificar
+"""
+from sqlalchemy import delete, insert, select, exists, func, text
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from app.database import SessionLocal
+from app import crud, models, notificaciones
+import argparse
+import os
+import time
+
+RETENCION_DIAS = int(os.getenv("RETENCION_DIAS", "90"))
+TAMANO_LOTE    = 1000
+
+
+# ══════════════════════════════════════════════════════════════
+# RETENCIÓN — mover conversaciones viejas a las tablas de archivo
+# ══════════════════════════════════════════════════════════════
+# Se trabaja por lotes pequeños (cada uno en su propia transacción)
+# para no bloquear las tablas que usa el webhook mientras corre.
+
+def crear_particion_mensual(db: Session, mes: datetime):
+    """Crea (si no existe) la partición de mensajes_whatsapp_archivo de ese mes"""
+    inicio    = mes.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    siguiente = (inicio + timedelta(days=32)).replace(day=1)
+    db.execute(text(
+        f"CREATE TABLE IF NOT EXISTS mensajes_whatsapp_archivo_{inicio:%Y_%m} "
+        f"PARTITION OF mensajes_whatsapp_archivo "
+        f"FOR VALUES FROM ('{inicio:%Y-%m-%d}') TO ('{siguiente:%Y-%m-%d}')"
+    ))
+
+
+def archivar_mensajes(db: Session, dias: int = RETENCION_DIAS, lote: int = TAMANO_LOTE) -> int:
+    """Mueve los mensajes con más de `dias` días a mensajes_whatsapp_archivo"""
+    mensaje = models.MensajeWhatsApp
+    sesion  = models.SesionWhatsApp
+    limite  = func.now() - timedelta(days=dias)
+    total   = 0
+
+    while True:
+        ids = db.scalars(
+            select(mensaje.id)
+            .where(mensaje.creado_en < limite)
+            .order_by(mensaje.id)
+            .limit(lote)
+        ).all()
+        if not ids:
+            break
+
+        # Cada mes del lote necesita su partición antes de insertar
+        meses = db.scalars(
+            select(func.date_trunc("month", mensaje.creado_en))
+            .where(mensaje.id.in_(ids))
+            .distinct()
+        ).all()
+        for mes in meses:
+            crear_particion_mensual(db, mes)
+
+        seleccion = (
+            select(mensaje.id, mensaje.sesion_id, sesion.telefono,
+                   mensaje.direccion, mensaje.contenido, mensaje.creado_en, mensaje.solicitud_id)
+            .join(sesion, sesion.id == mensaje.sesion_id)
+            .where(mensaje.id.in_(ids))
+        )
+        db.execute(
+            insert(models.MensajeWhatsAppArchivo).from_select(
+                ["id", "sesion_id", "telefono", "direccion", "contenido", "creado_en", "solicitud_id"],
+                seleccion
+            )
+        )
+        db.execute(delete(mensaje).where(mensaje.id.in_(ids)))
+        db.commit()
+        total += len(ids)
+
+    return total
+
+
+def archivar_sesiones(db: Session, dias: int = RETENCION_DIAS, lote: int = TAMANO_LOTE) -> int:
+    """
+    Mueve a sesiones_whatsapp_archivo las sesiones cerradas hace más de
+    `dias` días que ya no tienen mensajes en la tabla caliente.
+    """
+    sesion  = models.SesionWhatsApp
+    limite  = func.now() - timedelta(days=dias)
+    total   = 0
+
+    while True:
+        ids = db.scalars(
+            select(sesion.id)
+            .where(
+                sesion.activa == False,
+                func.coalesce(sesion.finalizada_en, sesion.iniciada_en) < limite,
+                ~exists().where(models.MensajeWhatsApp.sesion_id == sesion.id)
+            )
+            .order_by(sesion.id)
+            .limit(lote)
+        ).all()
+        if not ids:
+            break
+
+        seleccion = (
+            select(sesion.id, sesion.usuario_id, sesion.telefono,
+                   sesion.estado_sesion, sesion.iniciada_en, sesion.finalizada_en)
+            .where(sesion.id.in_(ids))
+        )
+        db.execute(
+            insert(models.SesionWhatsAppArchivo).from_select(
+                ["id", "usuario_id", "telefono", "estado_sesion", "iniciada_en", "finalizada_en"],
+                seleccion
+            )
+        )
+        db.execute(delete(sesion).where(sesion.id.in_(ids)))
+        db.commit()
+        total += len(ids)
+
+    return total
+
+
+# ══════════════════════════════════════════════════════════════
+# LÍNEA DE COMANDOS
+# ══════════════════════════════════════════════════════════════
+
+def main():
+    parser = argparse.ArgumentParser(description="Tareas de mantenimiento")
+    subcomandos = parser.add_subparsers(dest="tarea", required=True)
+
+    archivar = subcomandos.add_parser("archivar", help="Mueve conversaciones viejas al archivo")
+    archivar.add_argument("--dias", type=int, default=RETENCION_DIAS)
+    archivar.add_argument("--lote", type=int, default=TAMANO_LOTE)
+
+    expirar = subcomandos.add_parser("expirar", help="Cierra las sesiones de WhatsApp abandonadas")
+    expirar.add_argument("--minutos", type=int, default=crud.MINUTOS_INACTIVIDAD)
+    expirar.add_argument("--lote", type=int, default=100)
+    expirar.add_argument("--cada", type=int, default=0,
+                         help="Segundos entre barridos; 0 para ejecutar una sola vez")
+
+    invalidar = subcomandos.add_parser("invalidar", help="Vacía la caché de todos los workers")
+    invalidar.add_argument("que", choices=["catalogos"])
+
+    subcomandos.add_parser(
+        "notificar", help="Envía la bandeja de notificaciones (correr UN solo proceso)"
+    )
+
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        if args.tarea == "archivar":
+            mensajes = archivar_mensajes(db, args.dias, args.lote)
+            sesiones = archivar_sesiones(db, args.dias, args.lote)
+            print(f"Archivados {mensajes} mensajes y {sesiones} sesiones")
+
+        elif args.tarea == "expirar":
+            while True:
+                expiradas = crud.expirar_sesiones_inactivas(db, args.minutos, args.lote)
+                print(f"Expiradas {expiradas} sesiones")
+                if not args.cada:
+                    break
+                time.sleep(args.cada)
+
+        elif args.tarea == "invalidar":
+            crud.invalidar_catalogos()
+            print("Aviso enviado a los workers")
+
+        elif args.tarea == "notificar":
+            notificaciones.procesar_bandeja(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
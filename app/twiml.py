@@ -0,0 +1,22 @@
+"""
+Respuestas TwiML (el XML que Twilio espera del webhook).
+
+Solo necesitamos <Response><Message>texto</Message></Response>, así que lo
+armamos directamente en vez de cargar el SDK de Twilio y crear un
+MessagingResponse por cada mensaje. El texto se escapa para que un "<" o
+un "&" del usuario no rompa el XML.
+"""
+from xml.sax.saxutils import escape
+
+ENCABEZADO = '<?xml version="1.0" encoding="UTF-8"?>'
+
+
+def renderizar(texto: str = None) -> str:
+    """Devuelve el XML de respuesta; sin texto Twilio no contesta nada"""
+    if not texto:
+        return f"{ENCABEZADO}<Response />"
+    return f"{ENCABEZADO}<Response><Message>{escape(texto)}</Message></Response>"
+
+
+# Respuestas fijas: se arman una sola vez al importar
+RESPUESTA_VACIA = renderizar()
@@ -0,0 +1,52 @@
+-- ══════════════════════════════════════════════════════════════
+-- MIGRACIÓN 001: IDs de texto → UUID nativo
+-- ══════════════════════════════════════════════════════════════
+-- Las llaves de usuarios, solicitudes y sesiones_whatsapp eran
+-- VARCHAR con uuid4 (36 bytes). Pasan a UUID nativo (16 bytes) y
+-- las filas nuevas usan UUIDv7 (ordenado por tiempo, ver models.py).
+-- Los IDs existentes se conservan: un uuid4 en texto es un UUID válido.
+--
+-- Ejecutar en el editor SQL de Supabase (o con psql) una sola vez.
+
+BEGIN;
+
+-- 1. Quitamos las llaves foráneas que apuntan a las columnas que cambian
+ALTER TABLE solicitudes       DROP CONSTRAINT IF EXISTS solicitudes_solicitante_id_fkey;
+ALTER TABLE historial_estados DROP CONSTRAINT IF EXISTS historial_estados_solicitud_id_fkey;
+ALTER TABLE historial_estados DROP CONSTRAINT IF EXISTS historial_estados_usuario_id_fkey;
+ALTER TABLE sesiones_whatsapp DROP CONSTRAINT IF EXISTS sesiones_whatsapp_usuario_id_fkey;
+ALTER TABLE mensajes_whatsapp DROP CONSTRAINT IF EXISTS mensajes_whatsapp_sesion_id_fkey;
+
+-- 2. Cambiamos el tipo de las llaves primarias
+ALTER TABLE usuarios          ALTER COLUMN id TYPE uuid USING id::uuid;
+ALTER TABLE solicitudes       ALTER COLUMN id TYPE uuid USING id::uuid;
+ALTER TABLE sesiones_whatsapp ALTER COLUMN id TYPE uuid USING id::uuid;
+
+-- 3. Cambiamos el tipo de las llaves foráneas
+ALTER TABLE solicitudes       ALTER COLUMN solicitante_id TYPE uuid USING solicitante_id::uuid;
+ALTER TABLE historial_estados ALTER COLUMN solicitud_id   TYPE uuid USING solicitud_id::uuid;
+ALTER TABLE historial_estados ALTER COLUMN usuario_id     TYPE uuid USING usuario_id::uuid;
+ALTER TABLE sesiones_whatsapp ALTER COLUMN usuario_id     TYPE uuid USING usuario_id::uuid;
+ALTER TABLE mensajes_whatsapp ALTER COLUMN sesion_id      TYPE uuid USING sesion_id::uuid;
+
+-- 4. Volvemos a crear las llaves foráneas
+ALTER TABLE solicitudes       ADD CONSTRAINT solicitudes_solicitante_id_fkey
+    FOREIGN KEY (solicitante_id) REFERENCES usuarios (id);
+ALTER TABLE historial_estados ADD CONSTRAINT historial_estados_solicitud_id_fkey
+    FOREIGN KEY (solicitud_id) REFERENCES solicitudes (id);
+ALTER TABLE historial_estados ADD CONSTRAINT historial_estados_usuario_id_fkey
+    FOREIGN KEY (usuario_id) REFERENCES usuarios (id);
+ALTER TABLE sesiones_whatsapp ADD CONSTRAINT sesiones_whatsapp_usuario_id_fkey
+    FOREIGN KEY (usuario_id) REFERENCES usuarios (id);
+ALTER TABLE mensajes_whatsapp ADD CONSTRAINT mensajes_whatsapp_sesion_id_fkey
+    FOREIGN KEY (sesion_id) REFERENCES sesiones_whatsapp (id);
+
+-- 5. Índices en las llaves foráneas (Postgres no los crea solo)
+CREATE INDEX IF NOT EXISTS ix_solicitudes_solicitante_id     ON solicitudes (solicitante_id);
+CREATE INDEX IF NOT EXISTS ix_historial_estados_solicitud_id ON historial_estados (solicitud_id);
+CREATE INDEX IF NOT EXISTS ix_mensajes_whatsapp_sesion_id    ON mensajes_whatsapp (sesion_id);
+
+COMMIT;
+
+-- Después de migrar conviene reconstruir los índices que quedaron inflados:
+-- REINDEX TABLE usuarios; REINDEX TABLE solicitudes; REINDEX TABLE sesiones_whatsapp;
@@ -0,0 +1,44 @@
+-- ══════════════════════════════════════════════════════════════
+-- MIGRACIÓN 002: tablas de archivo para WhatsApp
+-- ══════════════════════════════════════════════════════════════
+-- "python -m app.tareas archivar --dias N" mueve aquí los mensajes y
+-- las sesiones cerradas con más de N días. Solo se consultan de vez
+-- en cuando, por teléfono y fecha.
+--
+-- Las sesiones archivadas no se particionan: es una fila por conversación,
+-- un volumen muy pequeño comparado con los mensajes.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS sesiones_whatsapp_archivo (
+    id            UUID PRIMARY KEY,
+    usuario_id    UUID,
+    telefono      VARCHAR(20) NOT NULL,
+    estado_sesion VARCHAR(30),
+    iniciada_en   TIMESTAMP,
+    finalizada_en TIMESTAMP,
+    archivada_en  TIMESTAMP DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_sesiones_archivo_telefono_iniciada
+    ON sesiones_whatsapp_archivo (telefono, iniciada_en);
+
+-- Particionada por mes de creado_en. Las particiones
+-- (mensajes_whatsapp_archivo_AAAA_MM) las crea el trabajo de archivo
+-- antes de insertar cada lote; un mes viejo se elimina con DROP TABLE.
+CREATE TABLE IF NOT EXISTS mensajes_whatsapp_archivo (
+    id           INTEGER NOT NULL,
+    sesion_id    UUID NOT NULL,
+    telefono     VARCHAR(20) NOT NULL,
+    direccion    VARCHAR(10) NOT NULL,
+    contenido    TEXT NOT NULL,
+    creado_en    TIMESTAMP NOT NULL,
+    archivado_en TIMESTAMP DEFAULT now(),
+    PRIMARY KEY (id, creado_en)
+) PARTITION BY RANGE (creado_en);
+CREATE INDEX IF NOT EXISTS ix_mensajes_archivo_telefono_creado
+    ON mensajes_whatsapp_archivo (telefono, creado_en);
+
+-- El trabajo de retención busca por fecha en la tabla caliente
+CREATE INDEX IF NOT EXISTS ix_mensajes_whatsapp_creado_en ON mensajes_whatsapp (creado_en);
+
+COMMIT;
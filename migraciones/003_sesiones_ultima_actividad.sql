@@ -0,0 +1,25 @@
+-- ══════════════════════════════════════════════════════════════
+-- MIGRACIÓN 003: última actividad de las sesiones de WhatsApp
+-- ══════════════════════════════════════════════════════════════
+-- Permite expirar las conversaciones abandonadas, tanto al buscar la
+-- sesión activa como con "python -m app.tareas expirar".
+
+BEGIN;
+
+ALTER TABLE sesiones_whatsapp ADD COLUMN IF NOT EXISTS ultima_actividad TIMESTAMP;
+
+-- Para las sesiones existentes usamos su último mensaje (o su inicio)
+UPDATE sesiones_whatsapp s
+   SET ultima_actividad = COALESCE(
+       (SELECT max(m.creado_en) FROM mensajes_whatsapp m WHERE m.sesion_id = s.id),
+       s.iniciada_en,
+       now()
+   );
+
+ALTER TABLE sesiones_whatsapp ALTER COLUMN ultima_actividad SET DEFAULT now();
+ALTER TABLE sesiones_whatsapp ALTER COLUMN ultima_actividad SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS ix_sesiones_whatsapp_activa_actividad
+    ON sesiones_whatsapp (ultima_actividad) WHERE activa;
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- ══════════════════════════════════════════════════════════════
+-- MIGRACIÓN 004: registro de eventos de solicitudes
+-- ══════════════════════════════════════════════════════════════
+-- Alimenta el feed GET /solicitudes/eventos (Server-Sent Events).
+-- El id es el "offset" con el que un cliente retoma tras reconectarse.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS eventos_solicitud (
+    id                SERIAL PRIMARY KEY,
+    solicitud_id      UUID NOT NULL REFERENCES solicitudes (id),
+    tipo_evento       VARCHAR(20) NOT NULL,
+    estado_id         INTEGER NOT NULL REFERENCES estados (id),
+    tipo_solicitud_id INTEGER NOT NULL REFERENCES tipos_solicitud (id),
+    creado_en         TIMESTAMP DEFAULT now()
+);
+
+COMMIT;
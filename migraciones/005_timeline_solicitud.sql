@@ -0,0 +1,23 @@
+-- ══════════════════════════════════════════════════════════════
+-- MIGRACIÓN 005: línea de tiempo de cada solicitud
+-- ══════════════════════════════════════════════════════════════
+-- Relaciona los mensajes de WhatsApp con la solicitud de la que tratan
+-- y agrega los índices (solicitud_id, creado_en) que usa
+-- GET /solicitudes/{id}/timeline para paginar con cursor.
+
+BEGIN;
+
+ALTER TABLE mensajes_whatsapp ADD COLUMN IF NOT EXISTS solicitud_id UUID REFERENCES solicitudes (id);
+ALTER TABLE mensajes_whatsapp_archivo ADD COLUMN IF NOT EXISTS solicitud_id UUID;
+
+CREATE INDEX IF NOT EXISTS ix_mensajes_whatsapp_solicitud_creado
+    ON mensajes_whatsapp (solicitud_id, creado_en) WHERE solicitud_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_mensajes_archivo_solicitud_creado
+    ON mensajes_whatsapp_archivo (solicitud_id, creado_en) WHERE solicitud_id IS NOT NULL;
+
+-- El índice compuesto también sirve para buscar solo por solicitud_id
+CREATE INDEX IF NOT EXISTS ix_historial_estados_solicitud_creado
+    ON historial_estados (solicitud_id, creado_en);
+DROP INDEX IF EXISTS ix_historial_estados_solicitud_id;
+
+COMMIT;
@@ -0,0 +1,28 @@
+-- ══════════════════════════════════════════════════════════════
+-- MIGRACIÓN 006: bandeja de salida de notificaciones por WhatsApp
+-- ══════════════════════════════════════════════════════════════
+-- crud.actualizar_estado_solicitud escribe aquí en la misma transacción
+-- del cambio de estado; el proceso "notificador" del Procfile la envía.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS notificaciones_salientes (
+    id                SERIAL PRIMARY KEY,
+    solicitud_id      UUID NOT NULL REFERENCES solicitudes (id),
+    telefono          VARCHAR(20) NOT NULL,
+    texto             TEXT NOT NULL,
+    estado            VARCHAR(20) NOT NULL DEFAULT 'PENDIENTE',
+    version           INTEGER NOT NULL DEFAULT 1,
+    intentos          INTEGER NOT NULL DEFAULT 0,
+    enviar_despues_de TIMESTAMP NOT NULL,
+    creado_en         TIMESTAMP DEFAULT now(),
+    enviada_en        TIMESTAMP
+);
+
+-- Una sola pendiente por solicitud: los cambios seguidos se juntan en ella
+CREATE UNIQUE INDEX IF NOT EXISTS ux_notificaciones_pendiente_por_solicitud
+    ON notificaciones_salientes (solicitud_id) WHERE estado = 'PENDIENTE';
+CREATE INDEX IF NOT EXISTS ix_notificaciones_pendientes
+    ON notificaciones_salientes (enviar_despues_de) WHERE estado = 'PENDIENTE';
+
+COMMIT;
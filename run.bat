@@ -26,4 +26,4 @@ Y envía el mensaje que te indica Twilio, algo como:
 join <palabra>
 Si ya lo hiciste antes y te llegó confirmación, no necesitas hacerlo de nuevo.
 
-UPDATE sesiones_whatsapp SET activa = false;
\ No newline at end of file
+.\venv\Scripts\python.exe -m app.tareas expirar
\ No newline at end of file
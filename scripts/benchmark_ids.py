@@ -0,0 +1,59 @@
+"""
+Benchmark de llaves primarias: VARCHAR + uuid4 (antes) vs UUID + UUIDv7 (ahora).
+
+Crea dos tablas temporales, inserta N filas en cada una y muestra
+las filas por segundo y el tamaño del índice de la llave primaria.
+
+Uso (necesita un Postgres, puede ser el de Supabase o uno local):
+    python scripts/benchmark_ids.py --filas 200000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text
+from app.database import engine
+from app.models import generar_uuid7
+
+
+TABLAS = {
+    "antes (varchar + uuid4)": ("bench_ids_texto", "VARCHAR", lambda: str(uuid.uuid4())),
+    "ahora (uuid + uuidv7)":   ("bench_ids_uuid7", "UUID",    generar_uuid7),
+}
+
+
+def medir(conn, tabla: str, tipo: str, generar, filas: int, lote: int):
+    conn.execute(text(f"DROP TABLE IF EXISTS {tabla}"))
+    conn.execute(text(f"CREATE TABLE {tabla} (id {tipo} PRIMARY KEY, dato TEXT)"))
+
+    inicio = time.perf_counter()
+    for _ in range(0, filas, lote):
+        valores = [{"id": generar(), "dato": "x"} for _ in range(lote)]
+        conn.execute(text(f"INSERT INTO {tabla} (id, dato) VALUES (:id, :dato)"), valores)
+    duracion = time.perf_counter() - inicio
+
+    tamano = conn.execute(
+        text("SELECT pg_relation_size(:indice)"), {"indice": f"{tabla}_pkey"}
+    ).scalar()
+    conn.execute(text(f"DROP TABLE {tabla}"))
+    return filas / duracion, tamano
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--lote", type=int, default=1_000)
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        for nombre, (tabla, tipo, generar) in TABLAS.items():
+            por_segundo, tamano = medir(conn, tabla, tipo, generar, args.filas, args.lote)
+            print(f"{nombre:<26} {por_segundo:>10,.0f} filas/s   índice PK: {tamano / 1024 / 1024:6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark de escalado con varios workers de uvicorn.
+
+Levanta la API con 1, 2, 4... workers (como en el Procfile), la carga con
+varios procesos cliente usando conexiones keep-alive y muestra las
+peticiones por segundo y cuánto se acerca al escalado lineal.
+
+Necesita la misma base de datos que la API (DATABASE_URL en .env), porque
+cada worker se conecta al arrancar. La ruta por defecto (/estados) sale de
+la caché de catálogos, así que mide la API y no a Postgres.
+
+Uso:
+    python scripts/benchmark_workers.py --workers 1 2 4 --clientes 16 --segundos 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.join(os.path.dirname(__file__), "..")
+
+
+def esperar_servidor(puerto: int, ruta: str, limite: float = 30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=2)
+            conexion.request("GET", ruta)
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError("La API no arrancó a tiempo")
+
+
+def cliente(argumentos):
+    """Hace peticiones sin parar durante `segundos`; devuelve cuántas salieron bien"""
+    puerto, ruta, segundos = argumentos
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=10)
+    fin = time.monotonic() + segundos
+    correctas = 0
+    while time.monotonic() < fin:
+        conexion.request("GET", ruta)
+        respuesta = conexion.getresponse()
+        respuesta.read()
+        if respuesta.status == 200:
+            correctas += 1
+    return correctas
+
+
+def medir(workers: int, puerto: int, ruta: str, clientes: int, segundos: float) -> float:
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(puerto), "--workers", str(workers), "--log-level", "warning"],
+        cwd=RAIZ
+    )
+    try:
+        esperar_servidor(puerto, ruta)
+        with multiprocessing.Pool(clientes) as pool:
+            total = sum(pool.map(cliente, [(puerto, ruta, segundos)] * clientes))
+        return total / segundos
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--ruta", default="/estados")
+    parser.add_argument("--puerto", type=int, default=8123)
+    args = parser.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}  (los clientes corren en la misma máquina)")
+    base = None
+    for workers in args.workers:
+        por_segundo = medir(workers, args.puerto, args.ruta, args.clientes, args.segundos)
+        base = base or por_segundo / workers
+        eficiencia = por_segundo / (base * workers)
+        print(f"{workers:>3} workers: {por_segundo:>9,.0f} pet/s   escalado {por_segundo / base:4.2f}x   eficiencia {eficiencia:5.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Presupuesto de tiempo de importación de la API (arranque en frío).
+
+Importa app.main en procesos nuevos, toma el mejor de varios intentos y
+falla (código de salida 1) si:
+- tarda más que el presupuesto, o
+- se cargó alguno de los módulos pesados que deben importarse al primer uso.
+
+Uso:
+    python scripts/medir_arranque.py --presupuesto 1.5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.join(os.path.dirname(__file__), "..")
+
+# Solo se usan en rutas poco frecuentes (login, registro, envío de notificaciones)
+MODULOS_PEREZOSOS = ["twilio", "jose", "bcrypt"]
+
+MEDIR = """
+import json, sys, time
+inicio = time.perf_counter()
+import app.main
+duracion = time.perf_counter() - inicio
+cargados = sorted({m.split(".")[0] for m in sys.modules} & set(%r))
+print(json.dumps({"segundos": duracion, "cargados": cargados}))
+""" % MODULOS_PEREZOSOS
+
+
+def medir_una_vez(entorno):
+    salida = subprocess.run(
+        [sys.executable, "-c", MEDIR], cwd=RAIZ, env=entorno,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def modulos_mas_lentos(entorno, cuantos: int = 10):
+    """Usa -X importtime para listar los módulos que más tardan en cargar"""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True
+    )
+    filas = []
+    for linea in salida.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, modulo = linea[len("import time:"):].split("|")
+        filas.append((int(acumulado), modulo.strip()))
+    return sorted(filas, reverse=True)[:cuantos]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--presupuesto", type=float, default=1.5, help="Segundos permitidos")
+    parser.add_argument("--intentos", type=int, default=5)
+    args = parser.parse_args()
+
+    # Importar no abre conexiones, así que basta una URL cualquiera
+    entorno = dict(os.environ)
+    entorno.setdefault("DATABASE_URL", "postgresql://localhost/arranque")
+
+    resultados = [medir_una_vez(entorno) for _ in range(args.intentos)]
+    mejor = min(r["segundos"] for r in resultados)
+    cargados = resultados[0]["cargados"]
+
+    print(f"Importar app.main: {mejor:.3f} s (presupuesto {args.presupuesto:.3f} s)")
+    print("Módulos más lentos:")
+    for microsegundos, modulo in modulos_mas_lentos(entorno):
+        print(f"  {microsegundos / 1000:8.1f} ms  {modulo}")
+
+    fallo = False
+    if mejor > args.presupuesto:
+        print("❌ Se pasó del presupuesto de arranque")
+        fallo = True
+    if cargados:
+        print(f"❌ Se cargaron módulos que deberían ser perezosos: {', '.join(cargados)}")
+        fallo = True
+    sys.exit(1 if fallo else 0)
+
+
+if __name__ == "__main__":
+    main()
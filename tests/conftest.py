@@ -0,0 +1,76 @@
+"""
+Las pruebas no necesitan Postgres: la URL de abajo nunca se usa para
+conectarse (importar la app no abre conexiones) y las que tocan la base
+de datos usan un SQLite en memoria.
+"""
+import os
+import sys
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/pruebas")
+os.environ.setdefault("SECRET_KEY", "clave-de-pruebas")
+os.environ["BUS_AVISOS"] = "local"
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.expression import BinaryExpression
+from sqlalchemy.types import Interval
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app import models
+
+
+@compiles(BinaryExpression, "sqlite")
+def fecha_mas_intervalo(expresion, compilador, **kw):
+    """
+    En Postgres `func.now() - timedelta(...)` es aritmética de fechas; SQLite
+    la convierte en una resta de textos. Aquí la traducimos a strftime para
+    que los filtros por antigüedad funcionen igual en las pruebas.
+    """
+    if isinstance(expresion.right.type, Interval) and expresion.operator in (operators.add, operators.sub):
+        segundos = expresion.right.effective_value.total_seconds()
+        if expresion.operator is operators.sub:
+            segundos = -segundos
+        fecha = compilador.process(expresion.left, **kw)
+        return f"strftime('%Y-%m-%d %H:%M:%f', {fecha}, '{segundos:+f} seconds')"
+    return compilador.visit_binary(expresion, **kw)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    sesion = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def solicitud(db):
+    """Una solicitud con su usuario, tipo y estado, lista para colgarle datos"""
+    db.add_all([
+        models.Rol(id=1, nombre="ESTUDIANTE"),
+        models.Estado(id=1, codigo="PENDIENTE", nombre="Pendiente"),
+        models.TipoSolicitud(id=1, nombre="Certificado de Notas"),
+    ])
+    usuario = models.Usuario(
+        nombres="Luz", apellidos="Perez", email="luz@test.com",
+        telefono_whatsapp="+573101234568", numero_documento="1111111111", rol_id=1
+    )
+    db.add(usuario)
+    db.flush()
+    nueva = models.Solicitud(
+        codigo_referencia="SOL-2026-00001", solicitante_id=usuario.id,
+        tipo_solicitud_id=1, estado_id=1, descripcion="prueba"
+    )
+    db.add(nueva)
+    db.commit()
+    return nueva
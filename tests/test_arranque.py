@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "..", "scripts", "medir_arranque.py")
+
+
+def test_importar_la_api_cabe_en_el_presupuesto():
+    """Falla si importar app.main se pasa del presupuesto o carga twilio/jose/bcrypt"""
+    presupuesto = os.getenv("PRESUPUESTO_ARRANQUE", "1.5")
+    resultado = subprocess.run(
+        [sys.executable, SCRIPT, "--presupuesto", presupuesto, "--intentos", "3"],
+        capture_output=True, text=True
+    )
+    assert resultado.returncode == 0, resultado.stdout + resultado.stderr
@@ -0,0 +1,31 @@
+from app.bus import BusLocal
+
+
+def test_bus_local_sin_sesion_entrega_ya():
+    bus, recibidos = BusLocal(), []
+    bus.suscribir(recibidos.append)
+    bus.publicar("cache:catalogos")
+    assert recibidos == ["cache:catalogos"]
+
+
+def test_bus_local_con_sesion_entrega_al_hacer_commit(db, solicitud):
+    bus, recibidos = BusLocal(), []
+    bus.suscribir(recibidos.append)
+
+    solicitud.descripcion = "cambio"
+    bus.publicar("eventos", db)
+    assert recibidos == []
+    db.commit()
+    assert recibidos == ["eventos"]
+
+
+def test_bus_local_descarta_el_aviso_si_hay_rollback(db, solicitud):
+    bus, recibidos = BusLocal(), []
+    bus.suscribir(recibidos.append)
+
+    solicitud.descripcion = "cambio"
+    db.flush()
+    bus.publicar("eventos", db)
+    db.rollback()
+    db.commit()
+    assert recibidos == []
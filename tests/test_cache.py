@@ -0,0 +1,29 @@
+from app.cache import CacheLocal
+
+
+def test_carga_una_sola_vez():
+    cache = CacheLocal()
+    cargas = []
+    for _ in range(3):
+        cache.obtener("catalogos:estados", lambda: cargas.append(1) or "estados")
+    assert len(cargas) == 1
+
+
+def test_invalidar_por_prefijo():
+    cache = CacheLocal()
+    cache.obtener("catalogos:estados", lambda: 1)
+    cache.obtener("otros:x", lambda: 2)
+    cache.invalidar("catalogos")
+    assert cache.obtener("catalogos:estados", lambda: 10) == 10
+    assert cache.obtener("otros:x", lambda: 20) == 2
+
+
+def test_invalidar_durante_la_carga_no_guarda_el_valor_viejo():
+    cache = CacheLocal()
+
+    def cargar_mientras_otro_invalida():
+        cache.invalidar("catalogos")   # ej: llega un aviso del bus a mitad de la carga
+        return "viejo"
+
+    assert cache.obtener("catalogos:estados", cargar_mientras_otro_invalida) == "viejo"
+    assert cache.obtener("catalogos:estados", lambda: "nuevo") == "nuevo"
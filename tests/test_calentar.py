@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+from app import main
+
+
+class BaseCaida:
+    """Hace de engine: cada conexión falla como si la base no respondiera"""
+    def __init__(self):
+        self.intentos = 0
+        self.pool = self
+
+    def size(self):
+        return 3
+
+    def connect(self):
+        self.intentos += 1
+        raise ConnectionError("la base no responde")
+
+    def dispose(self):
+        pass
+
+
+def test_calentar_no_falla_si_la_base_no_responde(monkeypatch):
+    principal, replica = BaseCaida(), BaseCaida()
+    monkeypatch.setattr(main, "engine", principal)
+    monkeypatch.setattr(main, "engine_lectura", replica)
+
+    main.calentar()
+
+    assert principal.intentos == 1 and replica.intentos == 1
+
+
+def test_el_worker_arranca_y_atiende_sin_base(monkeypatch):
+    monkeypatch.setattr(main, "engine", BaseCaida())
+    monkeypatch.setattr(main, "engine_lectura", BaseCaida())
+
+    # Como context manager, TestClient corre el lifespan completo
+    with TestClient(main.app) as cliente:
+        assert cliente.get("/").status_code == 200
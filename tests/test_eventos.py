@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app import crud, main, models
+
+
+class PedidoFalso:
+    """Hace de Request: headers fijos y se 'desconecta' tras `vueltas` chequeos"""
+    def __init__(self, vueltas, headers=None):
+        self.vueltas = vueltas
+        self.headers = headers or {}
+
+    async def is_disconnected(self):
+        self.vueltas -= 1
+        return self.vueltas < 0
+
+
+async def juntar(generador):
+    return [trozo async for trozo in generador]
+
+
+def ids(trozos):
+    return [int(t.split("\n")[0][4:]) for t in trozos if t.startswith("id: ")]
+
+
+@pytest.fixture
+def eventos(db, solicitud, monkeypatch):
+    """Cinco eventos alternando estado (1, 2) y tipo (1, 2); main usa la misma base"""
+    db.add_all([models.Estado(id=2, codigo="APROBADA", nombre="Aprobada"),
+                models.TipoSolicitud(id=2, nombre="Constancia")])
+    for i in range(5):
+        db.add(models.EventoSolicitud(
+            id=i + 1, solicitud_id=solicitud.id, tipo_evento="CAMBIO_ESTADO",
+            estado_id=1 + i % 2, tipo_solicitud_id=1 + (i // 2) % 2
+        ))
+    db.commit()
+    monkeypatch.setattr(main, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    monkeypatch.setattr(main, "get_usuario_actual", lambda token, db: None)
+    return solicitud
+
+
+def test_eventos_desde_un_id_en_orden(db, eventos):
+    assert [e.id for e in crud.get_eventos_desde(db, 2)] == [3, 4, 5]
+    assert [e.id for e in crud.get_eventos_desde(db, 0, limite=2)] == [1, 2]
+    assert crud.get_eventos_desde(db, 5) == []
+    assert crud.get_ultimo_evento_id(db) == 5
+
+
+def test_eventos_filtrados_por_estado_y_tipo(db, eventos):
+    assert [e.id for e in crud.get_eventos_desde(db, 0, estado_id=2)] == [2, 4]
+    assert [e.id for e in crud.get_eventos_desde(db, 0, tipo_solicitud_id=2)] == [3, 4]
+    assert [e.id for e in crud.get_eventos_desde(db, 0, estado_id=1, tipo_solicitud_id=2)] == [3]
+
+
+def test_sin_desde_arranca_en_el_ultimo_y_solo_manda_los_nuevos(db, eventos, monkeypatch):
+    async def llega_un_evento_nuevo(espera, timeout):
+        espera.close()
+        db.add(models.EventoSolicitud(
+            id=6, solicitud_id=eventos.id, tipo_evento="CAMBIO_ESTADO", estado_id=1, tipo_solicitud_id=1
+        ))
+        db.commit()
+        raise asyncio.TimeoutError
+    monkeypatch.setattr(main.asyncio, "wait_for", llega_un_evento_nuevo)
+
+    trozos = asyncio.run(juntar(main.generar_eventos(PedidoFalso(2), None, None, None)))
+
+    assert trozos[0] == ": ping\n\n"
+    assert ids(trozos) == [6]
+
+
+def test_retoma_desde_el_parametro_desde(eventos):
+    respuesta = main.feed_solicitudes(PedidoFalso(1), "token", desde=3)
+    assert ids(asyncio.run(juntar(respuesta.body_iterator))) == [4, 5]
+
+
+def test_last_event_id_manda_sobre_desde(eventos):
+    pedido = PedidoFalso(1, headers={"last-event-id": "1"})
+    respuesta = main.feed_solicitudes(pedido, "token", estado_id=1, desde=4)
+    assert ids(asyncio.run(juntar(respuesta.body_iterator))) == [3, 5]
@@ -0,0 +1,30 @@
+import uuid
+from types import SimpleNamespace
+from app import models
+
+
+def test_uuid7_marca_version_y_variante():
+    for _ in range(200):
+        id = uuid.UUID(models.generar_uuid7())
+        assert id.version == 7
+        assert id.variant == uuid.RFC_4122
+
+
+def test_uuid7_lleva_los_milisegundos_al_inicio(monkeypatch):
+    ms = 1_760_000_000_123
+    monkeypatch.setattr(models, "time", SimpleNamespace(time_ns=lambda: ms * 1_000_000 + 999_999))
+    assert uuid.UUID(models.generar_uuid7()).int >> 80 == ms
+
+
+def test_uuid7_de_milisegundos_distintos_ordenan_por_tiempo(monkeypatch):
+    ahora = [1_760_000_000_000]
+    monkeypatch.setattr(models, "time", SimpleNamespace(time_ns=lambda: ahora[0] * 1_000_000))
+
+    ids = []
+    for _ in range(100):
+        ids.append(models.generar_uuid7())
+        ahora[0] += 1
+
+    # Como texto y como UUID nativo (que es como compara Postgres)
+    assert ids == sorted(ids)
+    assert [uuid.UUID(i) for i in ids] == sorted(uuid.UUID(i) for i in ids)
@@ -0,0 +1,76 @@
+import types
+import pytest
+from app import limites
+from app.limites import TokenBucket, LimitadorPorClave, LimiteConcurrencia
+
+
+class Reloj:
+    """Reloj falso: el tiempo solo avanza cuando la prueba lo dice"""
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        self.ahora += segundos
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(limites, "time", types.SimpleNamespace(monotonic=reloj.monotonic, sleep=reloj.sleep))
+    return reloj
+
+
+def test_bucket_permite_rafaga_y_luego_rechaza(reloj):
+    cubeta = TokenBucket(tasa=1, capacidad=3)
+    assert [cubeta.tomar() for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_se_recarga_con_el_tiempo_sin_pasar_la_capacidad(reloj):
+    cubeta = TokenBucket(tasa=2, capacidad=2)
+    assert cubeta.tomar() and cubeta.tomar()
+    assert not cubeta.tomar()
+
+    reloj.ahora += 0.5           # media ficha por cada 0.25 s → 1 ficha
+    assert cubeta.tomar()
+    assert not cubeta.tomar()
+
+    reloj.ahora += 60            # mucho tiempo: se llena, pero solo hasta 2
+    assert [cubeta.tomar() for _ in range(3)] == [True, True, False]
+
+
+def test_bucket_esperar_duerme_lo_justo(reloj):
+    cubeta = TokenBucket(tasa=4, capacidad=1)
+    cubeta.esperar()
+    inicio = reloj.ahora
+    cubeta.esperar()
+    assert reloj.ahora - inicio == pytest.approx(0.25)
+
+
+def test_limitador_por_clave_separa_telefonos(reloj):
+    limitador = LimitadorPorClave(tasa=1, capacidad=1)
+    assert limitador.tomar("+571")
+    assert not limitador.tomar("+571")
+    assert limitador.tomar("+572")
+
+
+def test_limitador_por_clave_descarta_la_menos_usada(reloj):
+    limitador = LimitadorPorClave(tasa=0.001, capacidad=1, max_claves=2)
+    limitador.tomar("a")
+    limitador.tomar("b")
+    limitador.tomar("a")         # "a" pasa a ser la más reciente
+    limitador.tomar("c")         # hay 3: se descarta "b"
+
+    assert list(limitador._cubetas) == ["a", "c"]
+    assert not limitador.tomar("a")   # "a" conserva su cubeta vacía
+    assert limitador.tomar("b")       # "b" vuelve como nueva
+
+
+def test_limite_concurrencia_rechaza_lleno_y_libera():
+    limite = LimiteConcurrencia(2)
+    assert limite.entrar() and limite.entrar()
+    assert not limite.entrar()
+    limite.salir()
+    assert limite.entrar()
@@ -0,0 +1,118 @@
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import sessionmaker
+from app import models, notificaciones
+from app.limites import TokenBucket
+from datetime import datetime
+
+
+def pendiente(db, solicitud, **datos):
+    valores = dict(
+        solicitud_id=solicitud.id, telefono="+573101234568", texto="Tu solicitud cambió",
+        estado="PENDIENTE", version=1, intentos=0, enviar_despues_de=datetime(2026, 1, 1)
+    )
+    valores.update(datos)
+    notificacion = models.NotificacionSaliente(**valores)
+    db.add(notificacion)
+    db.commit()
+    return notificacion.id
+
+
+def test_envia_pendientes_y_guarda_el_saliente(db, solicitud):
+    id = pendiente(db, solicitud)
+    emisor = notificaciones.EmisorLocal()
+
+    tomadas = notificaciones.enviar_pendientes(db, emisor, TokenBucket(1000, 1000))
+
+    assert tomadas == 1
+    assert emisor.enviados == [("+573101234568", "Tu solicitud cambió")]
+    assert db.get(models.NotificacionSaliente, id).estado == "ENVIADA"
+    saliente = db.query(models.MensajeWhatsApp).one()
+    assert saliente.direccion == "SALIENTE" and saliente.solicitud_id == solicitud.id
+    # Ya no queda nada por enviar
+    assert notificaciones.enviar_pendientes(db, emisor, TokenBucket(1000, 1000)) == 0
+
+
+def test_si_falla_el_envio_queda_para_reintentar(db, solicitud):
+    id = pendiente(db, solicitud)
+
+    class EmisorCaido:
+        def enviar(self, telefono, texto):
+            raise ConnectionError("proveedor caído")
+
+    notificaciones.enviar_pendientes(db, EmisorCaido(), TokenBucket(1000, 1000))
+
+    tabla = models.NotificacionSaliente
+    estado, intentos = db.execute(select(tabla.estado, tabla.intentos).where(tabla.id == id)).one()
+    assert (estado, intentos) == ("PENDIENTE", 1)
+    assert db.query(models.MensajeWhatsApp).count() == 0
+
+
+def test_tras_agotar_reintentos_queda_fallida(db, solicitud):
+    id = pendiente(db, solicitud, intentos=notificaciones.REINTENTOS)
+
+    class EmisorCaido:
+        def enviar(self, telefono, texto):
+            raise ConnectionError("proveedor caído")
+
+    notificaciones.enviar_pendientes(db, EmisorCaido(), TokenBucket(1000, 1000))
+
+    tabla = models.NotificacionSaliente
+    assert db.execute(select(tabla.estado).where(tabla.id == id)).scalar() == "FALLIDA"
+
+
+def test_dos_notificadores_no_envian_la_misma_fila(db, solicitud):
+    """Mientras el primero envía, el segundo no ve la fila porque está reservada"""
+    pendiente(db, solicitud)
+    otra_sesion = sessionmaker(bind=db.get_bind())()
+
+    class EmisorQueCompite(notificaciones.EmisorLocal):
+        def enviar(self, telefono, texto):
+            super().enviar(telefono, texto)
+            self.del_otro = notificaciones.enviar_pendientes(
+                otra_sesion, notificaciones.EmisorLocal(), TokenBucket(1000, 1000)
+            )
+
+    emisor = EmisorQueCompite()
+    notificaciones.enviar_pendientes(db, emisor, TokenBucket(1000, 1000))
+    otra_sesion.close()
+
+    assert len(emisor.enviados) == 1
+    assert emisor.del_otro == 0
+
+
+def test_la_toma_pide_saltar_las_filas_bloqueadas(db, solicitud):
+    """SQLite ignora FOR UPDATE: revisamos que la consulta lo pida, como lo vería Postgres"""
+    pendiente(db, solicitud)
+    bloqueos = []
+
+    @event.listens_for(db, "do_orm_execute")
+    def anotar(estado):
+        if estado.is_select:
+            bloqueos.append(estado.statement._for_update_arg)
+
+    notificaciones.enviar_pendientes(db, notificaciones.EmisorLocal(), TokenBucket(1000, 1000))
+
+    assert bloqueos and bloqueos[0] is not None and bloqueos[0].skip_locked
+
+
+def test_si_cambia_el_texto_mientras_se_envia_sale_el_nuevo(db, solicitud):
+    id = pendiente(db, solicitud)
+    otra_sesion = sessionmaker(bind=db.get_bind())()
+
+    class EmisorConCambio(notificaciones.EmisorLocal):
+        def enviar(self, telefono, texto):
+            super().enviar(telefono, texto)
+            if len(self.enviados) == 1:
+                # Lo que haría encolar_notificacion con un cambio de estado nuevo
+                otra_sesion.execute(update(models.NotificacionSaliente).where(
+                    models.NotificacionSaliente.id == id
+                ).values(texto="Tu solicitud fue aprobada", version=2))
+                otra_sesion.commit()
+
+    emisor = EmisorConCambio()
+    notificaciones.enviar_pendientes(db, emisor, TokenBucket(1000, 1000))
+    notificaciones.enviar_pendientes(db, emisor, TokenBucket(1000, 1000))
+    otra_sesion.close()
+
+    assert [texto for _, texto in emisor.enviados] == ["Tu solicitud cambió", "Tu solicitud fue aprobada"]
+    assert db.get(models.NotificacionSaliente, id).estado == "ENVIADA"
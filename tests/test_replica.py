@@ -0,0 +1,137 @@
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import crud, database, main, models
+
+
+@pytest.fixture
+def dos_bases(monkeypatch):
+    """Principal y réplica como dos SQLite distintos; la réplica al día y nadie escribió"""
+    principal, replica = create_engine("sqlite://"), create_engine("sqlite://")
+    monkeypatch.setattr(database, "engine", principal)
+    monkeypatch.setattr(database, "engine_lectura", replica)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=principal))
+    monkeypatch.setattr(database, "SessionLectura", sessionmaker(bind=replica))
+    monkeypatch.setattr(database, "_escrituras", {})
+    monkeypatch.setitem(database._estado_replica, "al_dia", True)
+    monkeypatch.setitem(database._estado_replica, "revisado_en", time.monotonic())
+    return principal, replica
+
+
+def base_elegida(token=None):
+    dependencia = main.get_db_lectura(token)
+    db = next(dependencia)
+    try:
+        return db.get_bind()
+    finally:
+        dependencia.close()
+
+
+def test_sin_replica_configurada_lee_de_la_principal(dos_bases, monkeypatch):
+    principal, _ = dos_bases
+    monkeypatch.setattr(database, "engine_lectura", principal)
+    assert base_elegida(main.crear_token({"sub": "u1"})) is principal
+
+
+def test_replica_al_dia_y_sin_escrituras_lee_de_la_replica(dos_bases):
+    _, replica = dos_bases
+    assert base_elegida(main.crear_token({"sub": "u1"})) is replica
+    assert base_elegida() is replica
+
+
+def test_tras_escribir_lee_de_la_principal_con_cualquier_token(dos_bases):
+    principal, replica = dos_bases
+    main.marcar_escritura("u1")
+
+    # Otro token del mismo usuario también va a la principal; otro usuario no
+    assert base_elegida(main.crear_token({"sub": "u1", "dispositivo": "celular"})) is principal
+    assert base_elegida(main.crear_token({"sub": "u2"})) is replica
+
+
+def test_replica_atrasada_lee_de_la_principal(dos_bases, monkeypatch):
+    principal, _ = dos_bases
+    monkeypatch.setitem(database._estado_replica, "al_dia", False)
+    assert base_elegida(main.crear_token({"sub": "u1"})) is principal
+
+
+def test_token_invalido_no_impide_elegir_base(dos_bases):
+    _, replica = dos_bases
+    assert base_elegida("no-es-un-jwt") is replica
+
+
+def test_la_escritura_se_registra_aunque_falle_el_bus(monkeypatch):
+    def bus_caido(mensaje, db=None):
+        raise ConnectionError("sin bus")
+    monkeypatch.setattr(main.bus, "publicar", bus_caido)
+
+    main.marcar_escritura("u1")
+
+    assert database._escribio_hace_poco("u1")
+
+
+def test_solicitud_creada_por_whatsapp_marca_la_escritura(db, solicitud, monkeypatch):
+    monkeypatch.setattr(database, "_escrituras", {})
+    crud.invalidar_catalogos()
+    sesion = models.SesionWhatsApp(telefono="+573101234568", estado_sesion="ESPERANDO_DESCRIPCION_1")
+    db.add(sesion)
+    db.commit()
+
+    respuesta = main.procesar_mensaje("necesito mi certificado", "+573101234568", db, sesion)
+
+    assert "creada" in respuesta
+    assert database._escribio_hace_poco(str(solicitud.solicitante_id))
+
+
+class ReplicaContada:
+    """Hace de engine_lectura y cuenta cuántas veces se intentó conectar"""
+    def __init__(self):
+        self.conexiones = 0
+
+    def connect(self):
+        self.conexiones += 1
+        raise ConnectionError("réplica caída")
+
+
+def test_si_otro_request_esta_midiendo_se_usa_el_ultimo_estado(monkeypatch):
+    replica = ReplicaContada()
+    monkeypatch.setattr(database, "engine_lectura", replica)
+    monkeypatch.setitem(database._estado_replica, "al_dia", True)
+    monkeypatch.setitem(database._estado_replica, "revisado_en", 0.0)
+
+    with database._lock_chequeo:
+        assert database._replica_al_dia() is True
+    assert replica.conexiones == 0
+
+    # Ya sin nadie midiendo, este request sí consulta (y la encuentra caída)
+    assert database._replica_al_dia() is False
+    assert replica.conexiones == 1
+    # Y durante INTERVALO_CHEQUEO no se vuelve a consultar
+    assert database._replica_al_dia() is False
+    assert replica.conexiones == 1
+
+
+class ReplicaSinStreaming:
+    """La consulta de retraso devuelve NULL: la réplica dejó de recibir WAL"""
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        return False
+
+    def execute(self, consulta):
+        return self
+
+    def scalar(self):
+        return None
+
+
+def test_replica_sin_streaming_no_cuenta_como_al_dia(monkeypatch):
+    monkeypatch.setattr(database, "engine_lectura", ReplicaSinStreaming())
+    monkeypatch.setitem(database._estado_replica, "al_dia", True)
+    monkeypatch.setitem(database._estado_replica, "revisado_en", 0.0)
+
+    assert database._replica_al_dia() is False
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import crud, models
+
+
+def sesion(db, telefono, minutos_quieta):
+    nueva = models.SesionWhatsApp(
+        telefono=telefono, ultima_actividad=datetime.utcnow() - timedelta(minutes=minutos_quieta)
+    )
+    db.add(nueva)
+    db.commit()
+    return nueva.id
+
+
+def test_sesion_reciente_sigue_activa(db):
+    id = sesion(db, "+573100000001", minutos_quieta=1)
+    assert crud.get_sesion_activa(db, "+573100000001").id == id
+
+
+def test_sesion_quieta_se_cierra_al_buscarla(db):
+    id = sesion(db, "+573100000001", minutos_quieta=crud.MINUTOS_INACTIVIDAD + 5)
+
+    assert crud.get_sesion_activa(db, "+573100000001") is None
+    cerrada = db.get(models.SesionWhatsApp, id)
+    assert cerrada.activa is False and cerrada.finalizada_en is not None
+
+
+def test_un_mensaje_entrante_renueva_la_sesion(db):
+    id = sesion(db, "+573100000001", minutos_quieta=crud.MINUTOS_INACTIVIDAD - 1)
+    crud.guardar_mensaje_whatsapp(db, id, "ENTRANTE", "hola")
+    db.expire_all()
+
+    # Ya pasó el plazo contado desde el inicio, pero no desde el último mensaje
+    assert db.get(models.SesionWhatsApp, id).ultima_actividad > datetime.utcnow() - timedelta(minutes=1)
+    assert crud.get_sesion_activa(db, "+573100000001").id == id
+
+
+def test_barrido_cierra_por_lotes_solo_las_quietas(db):
+    quietas = [sesion(db, f"+57310000000{i}", minutos_quieta=60) for i in range(5)]
+    activa = sesion(db, "+573109999999", minutos_quieta=1)
+
+    assert crud.expirar_sesiones_inactivas(db, minutos=30, lote=2) == 5
+
+    db.expire_all()
+    assert all(not db.get(models.SesionWhatsApp, id).activa for id in quietas)
+    assert db.get(models.SesionWhatsApp, activa).activa
+    assert crud.expirar_sesiones_inactivas(db, minutos=30, lote=2) == 0
+
+
+def test_barrido_pide_saltar_las_filas_bloqueadas(db):
+    """SQLite ignora FOR UPDATE: revisamos que la consulta lo pida, como lo vería Postgres"""
+    sesion(db, "+573100000001", minutos_quieta=60)
+    bloqueos = []
+
+    @event.listens_for(db, "do_orm_execute")
+    def anotar(estado):
+        if estado.is_select:
+            bloqueos.append(estado.statement._for_update_arg)
+
+    crud.expirar_sesiones_inactivas(db, minutos=30, lote=10)
+
+    assert bloqueos and all(b is not None and b.skip_locked for b in bloqueos)
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+import pytest
+from app import models, tareas
+
+HACE_120_DIAS = datetime.utcnow() - timedelta(days=120)
+
+
+@pytest.fixture
+def particiones(db, monkeypatch):
+    """
+    Las particiones y date_trunc son de Postgres: en SQLite registramos un
+    date_trunc equivalente y anotamos qué meses se pidieron crear
+    """
+    conexion = db.connection().connection.driver_connection
+    conexion.create_function("date_trunc", 2, lambda unidad, fecha: fecha[:8] + "01 00:00:00.000000")
+    meses = []
+    monkeypatch.setattr(tareas, "crear_particion_mensual", lambda db, mes: meses.append(mes))
+    return meses
+
+
+def sesion(db, iniciada_en, activa=False):
+    nueva = models.SesionWhatsApp(
+        telefono="+573101234568", activa=activa, iniciada_en=iniciada_en,
+        finalizada_en=None if activa else iniciada_en + timedelta(minutes=10)
+    )
+    db.add(nueva)
+    db.flush()
+    return nueva
+
+
+def mensaje(db, sesion, creado_en, solicitud_id=None):
+    nuevo = models.MensajeWhatsApp(
+        sesion_id=sesion.id, direccion="ENTRANTE", contenido=f"hola {creado_en:%d}",
+        creado_en=creado_en, solicitud_id=solicitud_id
+    )
+    db.add(nuevo)
+    db.flush()
+    return nuevo
+
+
+def test_archivar_mensajes_conserva_id_telefono_y_solicitud(db, solicitud, particiones):
+    vieja = sesion(db, HACE_120_DIAS)
+    viejos = [mensaje(db, vieja, HACE_120_DIAS + timedelta(minutes=i), solicitud.id) for i in range(3)]
+    reciente = mensaje(db, sesion(db, datetime.utcnow(), activa=True), datetime.utcnow())
+    esperados = {m.id: (m.creado_en, m.contenido) for m in viejos}
+    db.commit()
+
+    assert tareas.archivar_mensajes(db, dias=90, lote=2) == 3
+
+    archivados = db.query(models.MensajeWhatsAppArchivo).all()
+    assert {a.id: (a.creado_en, a.contenido) for a in archivados} == esperados
+    assert all(a.telefono == "+573101234568" and a.solicitud_id == solicitud.id for a in archivados)
+    assert all(a.sesion_id == vieja.id for a in archivados)
+    assert [m.id for m in db.query(models.MensajeWhatsApp).all()] == [reciente.id]
+    assert particiones and all(m.startswith(f"{HACE_120_DIAS:%Y-%m}-01") for m in particiones)
+
+
+def test_archivar_sesiones_salta_las_que_tienen_mensajes_calientes(db):
+    con_mensajes = sesion(db, HACE_120_DIAS)
+    mensaje(db, con_mensajes, datetime.utcnow())
+    sin_mensajes = sesion(db, HACE_120_DIAS)
+    activa = sesion(db, HACE_120_DIAS, activa=True)
+    reciente = sesion(db, datetime.utcnow() - timedelta(days=1))
+    ids = (con_mensajes.id, sin_mensajes.id, activa.id, reciente.id)
+    db.commit()
+
+    assert tareas.archivar_sesiones(db, dias=90) == 1
+
+    archivada = db.query(models.SesionWhatsAppArchivo).one()
+    assert archivada.id == ids[1] and archivada.telefono == "+573101234568"
+    quedan = {s.id for s in db.query(models.SesionWhatsApp).all()}
+    assert quedan == {ids[0], ids[2], ids[3]}
+
+
+def test_archivar_todo_deja_la_conversacion_entera_en_el_archivo(db, solicitud, particiones):
+    vieja = sesion(db, HACE_120_DIAS)
+    mensaje(db, vieja, HACE_120_DIAS, solicitud.id)
+    sesion_id = vieja.id
+    db.commit()
+
+    assert tareas.archivar_mensajes(db, dias=90) == 1
+    assert tareas.archivar_sesiones(db, dias=90) == 1
+    assert db.query(models.SesionWhatsApp).count() == 0
+    assert db.query(models.MensajeWhatsAppArchivo).one().sesion_id == sesion_id
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import pytest
+from app import crud, models
+
+
+def test_cursor_ida_y_vuelta():
+    fecha = datetime(2026, 3, 1, 8, 30, 15, 123456)
+    cursor = crud.codificar_cursor(fecha, "WHATSAPP", 42)
+    assert crud.decodificar_cursor(cursor) == (fecha, "WHATSAPP", 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", crud.codificar_cursor(datetime(2026, 1, 1), "OTRA", 1)])
+def test_cursor_invalido(cursor):
+    with pytest.raises(ValueError):
+        crud.decodificar_cursor(cursor)
+
+
+def llenar_timeline(db, solicitud):
+    """
+    40 eventos repartidos en 3 fuentes con muchas fechas repetidas,
+    para que el orden dependa de los desempates (fuente, id)
+    """
+    sesion = models.SesionWhatsApp(telefono="+573101234568")
+    db.add(sesion)
+    db.flush()
+
+    base = datetime(2026, 3, 1, 8, 0, 0)
+    for i in range(40):
+        fecha = base + timedelta(minutes=i // 4)   # de a 4 eventos por minuto
+        if i % 3 == 0:
+            db.add(models.HistorialEstado(
+                id=1000 + i, solicitud_id=solicitud.id, estado_nuevo_id=1,
+                usuario_id=solicitud.solicitante_id, creado_en=fecha
+            ))
+        elif i % 3 == 1:
+            db.add(models.MensajeWhatsApp(
+                id=2000 + i, sesion_id=sesion.id, solicitud_id=solicitud.id,
+                direccion="ENTRANTE", contenido=f"m{i}", creado_en=fecha
+            ))
+        else:
+            db.add(models.MensajeWhatsAppArchivo(
+                id=3000 - i, sesion_id=sesion.id, solicitud_id=solicitud.id, telefono=sesion.telefono,
+                direccion="SALIENTE", contenido=f"a{i}", creado_en=fecha
+            ))
+    db.commit()
+
+
+def clave(evento):
+    return (evento["creado_en"], crud.FUENTES_TIMELINE[evento["fuente"]], evento["id"])
+
+
+def test_primera_pagina_completa_en_orden(db, solicitud):
+    llenar_timeline(db, solicitud)
+    eventos, siguiente = crud.get_timeline_solicitud(db, solicitud.id, limite=100)
+
+    assert len(eventos) == 40
+    assert siguiente is None
+    assert [clave(e) for e in eventos] == sorted(clave(e) for e in eventos)
+    assert {e["fuente"] for e in eventos} == {"HISTORIAL", "WHATSAPP"}
+    # Los archivados también aparecen
+    assert any(e["id"] < 3000 and e["id"] > 2900 for e in eventos)
+
+
+@pytest.mark.parametrize("limite", [1, 3, 7, 13, 39])
+def test_paginar_con_cursor_no_repite_ni_salta_eventos(db, solicitud, limite):
+    llenar_timeline(db, solicitud)
+    completo, _ = crud.get_timeline_solicitud(db, solicitud.id, limite=100)
+
+    paginas, cursor = [], None
+    while True:
+        eventos, cursor = crud.get_timeline_solicitud(db, solicitud.id, cursor, limite)
+        assert len(eventos) <= limite
+        paginas.extend(eventos)
+        if cursor is None:
+            break
+
+    assert [clave(e) for e in paginas] == [clave(e) for e in completo]
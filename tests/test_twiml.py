@@ -0,0 +1,16 @@
+import xml.etree.ElementTree as ET
+from app import twiml
+
+
+def test_sin_texto_es_respuesta_vacia():
+    raiz = ET.fromstring(twiml.renderizar().encode("utf-8"))
+    assert raiz.tag == "Response" and len(raiz) == 0
+    assert twiml.RESPUESTA_VACIA == twiml.renderizar(None)
+
+
+def test_escapa_el_texto_del_usuario():
+    texto = '👋 <b>Hola</b> & "adios" </Message><Message>inyectado'
+    raiz = ET.fromstring(twiml.renderizar(texto).encode("utf-8"))
+    mensajes = raiz.findall("Message")
+    assert len(mensajes) == 1
+    assert mensajes[0].text == texto
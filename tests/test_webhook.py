@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+from app.limites import LimitadorPorClave, LimiteConcurrencia
+
+RAIZ = os.path.join(os.path.dirname(__file__), "..")
+
+# Sin "with TestClient(...)" no corre el lifespan, así no se conecta a la BD
+cliente = TestClient(main.app, raise_server_exceptions=False)
+
+
+def enviar(telefono="+573101234568", texto="hola"):
+    return cliente.post("/whatsapp", data={"From": f"whatsapp:{telefono}", "Body": texto})
+
+
+@pytest.fixture
+def limites(monkeypatch):
+    monkeypatch.setattr(main, "limite_por_telefono", LimitadorPorClave(tasa=0.001, capacidad=1))
+    monkeypatch.setattr(main, "limite_en_curso", LimiteConcurrencia(1))
+    monkeypatch.setattr(main, "atender_whatsapp", lambda mensaje, telefono: f"eco: {mensaje}")
+
+
+def test_responde_en_twiml(limites):
+    respuesta = enviar(texto="a < b")
+    assert respuesta.headers["content-type"].startswith("application/xml")
+    assert "<Message>eco: a &lt; b</Message>" in respuesta.text
+
+
+def test_telefono_sobre_el_limite_no_recibe_respuesta(limites):
+    enviar()
+    respuesta = enviar()
+    assert "<Response />" in respuesta.text
+
+
+def test_ocupado_no_gasta_fichas_del_telefono(limites, monkeypatch):
+    monkeypatch.setattr(main, "limite_en_curso", LimiteConcurrencia(0))
+    for _ in range(3):
+        assert "muchas consultas" in enviar().text
+
+    monkeypatch.setattr(main, "limite_en_curso", LimiteConcurrencia(1))
+    assert "eco: hola" in enviar().text
+
+
+def test_libera_el_cupo_si_el_turno_falla(limites, monkeypatch):
+    def falla(mensaje, telefono):
+        raise RuntimeError("se cayó la BD")
+    monkeypatch.setattr(main, "atender_whatsapp", falla)
+
+    assert enviar().status_code == 500
+    assert main.limite_en_curso._en_curso == 0
+
+
+def limites_con_workers(workers):
+    """Importa la app en otro proceso con WEB_CONCURRENCY dado y devuelve sus límites"""
+    codigo = (
+        "from app import main; "
+        "print(main.limite_por_telefono.tasa * 60, main.limite_por_telefono.capacidad, "
+        "main.limite_en_curso.maximo)"
+    )
+    entorno = dict(os.environ, WEB_CONCURRENCY=str(workers), WEBHOOK_MENSAJES_POR_MINUTO="20",
+                   WEBHOOK_RAFAGA="5", WEBHOOK_MAX_EN_CURSO="20")
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return [round(float(valor), 6) for valor in salida]
+
+
+def test_los_limites_del_env_se_reparten_entre_los_workers():
+    assert limites_con_workers(1) == [20, 5, 20]
+    assert limites_con_workers(4) == [5, 1.25, 5]
+    # Nunca baja de una ficha ni de un turno por worker
+    assert limites_con_workers(40) == [0.5, 1, 1]